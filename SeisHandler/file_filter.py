@@ -1,12 +1,107 @@
-import sys
 import logging
 from datetime import datetime
-from typing import List, Dict, Optional, Any
-from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Dict, Optional, Any, Collection, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
 
 # Create a logger
 logger = logging.getLogger(__name__)
 
+# above this many files, order the criteria by how many files they reject
+_CALIBRATION_THRESHOLD = 10000
+# number of files sampled to estimate the rejection rates
+_CALIBRATION_SAMPLE = 1000
+
+# marks a field that is absent from file_info, so one dict probe is enough
+_MISSING = object()
+
+
+def _is_datetime(val: Any) -> bool:
+    return isinstance(val, datetime)
+
+
+def _is_numeric(val: Any) -> bool:
+    # as long as it can be cast to float we consider it numeric
+    try:
+        float(val)
+        return True
+    except (ValueError, TypeError):
+        return False
+
+
+def _is_str(val: Any) -> bool:
+    return isinstance(val, str)
+
+
+def _list_predicate(field_name: str, valid_values, checker, file_info: Dict) -> bool:
+    """Check one 'list' criterion: presence, optional type and membership."""
+    file_value = file_info.get(field_name, _MISSING)
+    if file_value is _MISSING:
+        return False
+    if checker is not None and not checker(file_value):
+        return False
+    return file_value in valid_values
+
+
+def _range_predicate(field_name: str, pairs, checker, file_info: Dict) -> bool:
+    """Check one 'range' criterion: presence, optional type and any (start, end) pair."""
+    file_value = file_info.get(field_name, _MISSING)
+    # None is never inside a range, with or without a declared type
+    if file_value is _MISSING or file_value is None:
+        return False
+    if checker is not None and not checker(file_value):
+        logger.warning(f"Field '{field_name}' has an invalid type '{type(file_value)}'.")
+        return False
+    for start, end in pairs:
+        if start <= file_value <= end:
+            return True
+    return False
+
+
+def _sorted_range_arrays(pairs: List[tuple]) -> Optional[tuple]:
+    """
+    Merge the (start, end) pairs into sorted, disjoint intervals stored as two
+    NumPy arrays, so a value can be located with a single searchsorted.
+    Return None when the bounds are neither naive datetimes nor numbers.
+    """
+    try:
+        intervals = sorted((start, end) for start, end in pairs if start <= end)
+    except TypeError:
+        return None
+
+    merged: List[list] = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    bounds = [b for interval in merged for b in interval]
+
+    if all(isinstance(b, datetime) and b.tzinfo is None for b in bounds):
+        # microseconds, like datetime itself: [ns] only spans 1677-2262 and
+        # would silently wrap datetime(9999, 1, 1) and friends
+        starts = np.array([start for start, _ in merged], dtype="datetime64[us]")
+        ends = np.array([end for _, end in merged], dtype="datetime64[us]")
+    elif all(isinstance(b, (int, float)) and not isinstance(b, bool) for b in bounds):
+        starts = np.array([start for start, _ in merged])
+        ends = np.array([end for _, end in merged])
+    else:
+        return None
+    return starts, ends
+
+
+# declared data_type -> checker, module level so FileFilter stays picklable
+_TYPE_CHECKERS = {
+    "datetime": _is_datetime,
+    "float": _is_numeric,
+    "int": _is_numeric,
+    "numeric": _is_numeric,
+    "str": _is_str,
+}
+
 
 class FileFilter:
     """_summary_
@@ -52,12 +147,15 @@ class FileFilter:
         self.raw_criteria = criteria or {}
 
         # separate the list and range criteria
-        self.list_criteria: Dict[str, List[Any]] = {}
+        self.list_criteria: Dict[str, Collection[Any]] = {}
         self.range_criteria: Dict[str, List[tuple]] = {}
 
         # record the declared data type of each field
         self.type_map: Dict[str, Optional[str]] = {}
 
+        # merged, sorted range bounds for the vectorized check
+        self._range_np: Dict[str, tuple] = {}
+
         self.num_threads = num_threads
 
         self._parse_criteria()
@@ -68,9 +166,11 @@ class FileFilter:
             # cfg should be like {"type": "list"/"range", "value": ...}
             if not isinstance(cfg, dict) or "type" not in cfg or "value" not in cfg:
                 logger.error(
-                    f"Field '{field_name}' is invalid. Must contain 'type' and 'value'. Skipped."
+                    f"Field '{field_name}' is invalid. Must contain 'type' and 'value'."
+                )
+                raise ValueError(
+                    f"Field '{field_name}' invalid: must contain 'type' and 'value'"
                 )
-                sys.exit(1)
 
             filter_type = cfg["type"]
             declared_type = cfg.get("data_type")
@@ -88,6 +188,54 @@ class FileFilter:
                     f"Field '{field_name}' has unknown filter type '{filter_type}'. Skipped."
                 )
 
+        self._compile_checks()
+
+    def _compile_checks(self) -> None:
+        """
+        Resolve the per-field checker once, so the per-file predicates only compare.
+        Produce (field_name, valid_values/pairs, checker or None) tuples.
+        """
+        self._compiled_list = [
+            (field_name, valid_values, _TYPE_CHECKERS.get(self.type_map.get(field_name)))
+            for field_name, valid_values in self.list_criteria.items()
+        ]
+        self._compiled_range = [
+            (field_name, pairs, _TYPE_CHECKERS.get(self.type_map.get(field_name)))
+            for field_name, pairs in self.range_criteria.items()
+        ]
+        # one flat predicate list walked once per file, list criteria first;
+        # self._criteria names the (kind, field) of each predicate, same order
+        self._predicates = [
+            partial(_list_predicate, *check) for check in self._compiled_list
+        ] + [partial(_range_predicate, *check) for check in self._compiled_range]
+        self._criteria = [("list", check[0]) for check in self._compiled_list] + [
+            ("range", check[0]) for check in self._compiled_range
+        ]
+
+    def _order_by_selectivity(self, file_list: List[Dict]) -> None:
+        """
+        Estimate the rejection rate of every criterion on an evenly spaced
+        sample of `file_list`, and evaluate the most selective ones first.
+        """
+        step = max(1, len(file_list) // _CALIBRATION_SAMPLE)
+        sample = file_list[::step][:_CALIBRATION_SAMPLE]
+        # score with the same masks as `_filter_files_vectorized`, so values
+        # it can handle (e.g. time=None) never make the calibration fail
+        df = pd.DataFrame(sample, columns=self._criteria_fields())
+        try:
+            reject_rates = [
+                1 - self._criterion_mask(kind, field_name, df[field_name], sample).mean()
+                for kind, field_name in self._criteria
+            ]
+        except TypeError:
+            # incomparable values, keep the declared order
+            logger.debug("criteria not comparable column-wise, order left unchanged")
+            return
+        order = sorted(range(len(reject_rates)), key=lambda i: -reject_rates[i])
+        self._predicates = [self._predicates[i] for i in order]
+        self._criteria = [self._criteria[i] for i in order]
+        logger.debug(f"criteria ordered by selectivity: {self._criteria}")
+
     def _parse_list_criteria(self, field_name: str, values) -> None:
         """Handle the 'list' type criteria."""
         # filtering by list: 'values' itself should be a list of valid items
@@ -97,8 +245,12 @@ class FileFilter:
             )
             return
 
-        # store directly
-        self.list_criteria[field_name] = values
+        # store as a frozenset so each membership test is a hash lookup,
+        # fall back to the list for unhashable items
+        try:
+            self.list_criteria[field_name] = frozenset(values)
+        except TypeError:
+            self.list_criteria[field_name] = values
 
     def _parse_range_criteria(self, field_name: str, values) -> None:
         """Handle the 'range' type criteria."""
@@ -125,85 +277,139 @@ class FileFilter:
 
         if range_pairs:
             self.range_criteria[field_name] = range_pairs
+            range_arrays = _sorted_range_arrays(range_pairs)
+            if range_arrays is not None:
+                self._range_np[field_name] = range_arrays
 
     # -----------------------------------------------------------------------
     # Checking methods
     # -----------------------------------------------------------------------
-    def _check_file_in_list_criteria(self, file_info: Dict) -> bool:
-        """Check if file_info meets all 'list' criteria."""
-        for field_name, valid_list in self.list_criteria.items():
-            if field_name not in file_info:
-                return False
-
-            declared_type = self.type_map.get(field_name, None)
-            file_value = file_info[field_name]
-
-            # 1) optional type check
-            if declared_type is not None:
-                if not self._check_type(file_value, declared_type):
-                    return False
-
-            # 2) check membership
-            if file_value not in valid_list:
-                return False
-        return True
-
-    def _check_file_in_range_criteria(self, file_info: Dict) -> bool:
-        """Check if the file_info meets all 'range' criteria."""
-        for field_name, pairs in self.range_criteria.items():
-            if field_name not in file_info:
-                return False
-
-            declared_type = self.type_map.get(field_name, None)
-            file_value = file_info[field_name]
-            if declared_type and not self._check_type(file_value, declared_type):
-                logger.warning(
-                    f"Field '{field_name}' has an invalid type '{type(file_value)}'."
-                )
-                return False
-
-            in_any_range = False
-
-            for start, end in pairs:
-                if start <= file_value <= end:
-                    in_any_range = True
-                    break
-
-            if not in_any_range:
-                return False
-
-        return True
-
     def _check_type(self, val: Any, declared_type: str) -> bool:
         """
         A helper method to check whether `val` matches the declared_type.
         Return True if it matches, or False otherwise.
         """
-        if declared_type == "datetime":
-            return isinstance(val, datetime)
-        elif declared_type in ("float", "int", "numeric"):
-            # as long as it can be cast to float we consider it numeric
-            try:
-                float(val)
-                return True
-            except (ValueError, TypeError):
-                return False
-        elif declared_type == "str":
-            return isinstance(val, str)
+        checker = _TYPE_CHECKERS.get(declared_type)
         # if no recognized declared_type, we just skip check
-        return True
+        return checker is None or checker(val)
 
     def _is_valid_file(self, file_info: Dict) -> bool:
-        """check if the file_info is valid"""
-        # check list
-        if not self._check_file_in_list_criteria(file_info):
-            return False
+        """check if the file_info is valid, stop at the first failing criterion"""
+        for predicate in self._predicates:
+            if not predicate(file_info):
+                return False
+        return True
 
-        # check range
-        if not self._check_file_in_range_criteria(file_info):
-            return False
+    # -----------------------------------------------------------------------
+    # Vectorized checking methods
+    # -----------------------------------------------------------------------
+    def _type_mask(self, column: pd.Series, declared_type: Optional[str]) -> np.ndarray:
+        """Vectorized counterpart of `_check_type` over a whole column."""
+        if declared_type == "datetime":
+            if pd.api.types.is_datetime64_any_dtype(column):
+                return column.notna().to_numpy()
+        elif declared_type in ("float", "int", "numeric"):
+            return pd.to_numeric(column, errors="coerce").notna().to_numpy()
+        checker = _TYPE_CHECKERS.get(declared_type)
+        if checker is None:
+            return np.ones(len(column), dtype=bool)
+        return column.map(checker).to_numpy(dtype=bool)
+
+    def _list_mask(self, column: pd.Series, valid_values) -> np.ndarray:
+        """Membership of each value of `column` in `valid_values`."""
+        return column.isin(list(valid_values)).to_numpy()
+
+    def _range_mask(self, column: pd.Series, field_name: str) -> np.ndarray:
+        """Whether each value of `column` falls into any of the field's (start, end) pairs."""
+        range_arrays = self._range_np.get(field_name)
+        values = None
+        if range_arrays is not None:
+            starts, ends = range_arrays
+            if starts.dtype.kind == "M" and pd.api.types.is_datetime64_any_dtype(column):
+                values = column.to_numpy().astype("datetime64[us]")
+            elif (
+                starts.dtype.kind in "iuf"
+                and pd.api.types.is_numeric_dtype(column)
+                and not pd.api.types.is_bool_dtype(column)
+            ):
+                values = column.to_numpy()
+
+        if values is not None:
+            # the intervals are disjoint and sorted: find the last start <= value,
+            # the value is inside if it is also <= that interval's end
+            idx = np.searchsorted(starts, values, side="right") - 1
+            inside = idx >= 0
+            inside[inside] = values[inside] <= ends[idx[inside]]
+            return inside
+
+        pairs = self.range_criteria[field_name]
+        starts = [start for start, _ in pairs]
+        ends = [end for _, end in pairs]
+        if pd.api.types.is_datetime64_any_dtype(column):
+            values = column.to_numpy()
+            starts = pd.to_datetime(starts).to_numpy()
+            ends = pd.to_datetime(ends).to_numpy()
+        else:
+            values = column.to_numpy(dtype=object)
+            starts = np.array(starts, dtype=object)
+            ends = np.array(ends, dtype=object)
+
+        # compare every value against every pair at once: (N, 1) vs (P,)
+        values = values[:, None]
+        return ((values >= starts) & (values <= ends)).any(axis=1)
+
+    def _criterion_mask(
+        self, kind: str, field_name: str, column: pd.Series, records: List[Dict]
+    ) -> np.ndarray:
+        """
+        Boolean mask of the values of `column` passing one criterion.
+        `column` is indexed by position in `records`, the dicts it was built from.
+        """
+        present = column.notna().to_numpy()
+        typed = self._type_mask(column, self.type_map.get(field_name))
+        if kind == "list":
+            mask = present & typed & self._list_mask(column, self.list_criteria[field_name])
+            if not present.all():
+                # a null cell is a missing key, None or NaN, which the list may
+                # or may not match: ask the per-file predicate for these rows
+                predicate = self._predicates[self._criteria.index((kind, field_name))]
+                positions = column.index.to_numpy()[~present]
+                mask[~present] = [predicate(records[i]) for i in positions]
+            return mask
+
+        if (present & ~typed).any():
+            logger.warning(
+                f"Field '{field_name}' has {(present & ~typed).sum()} values of invalid type."
+            )
+        valid = present & typed
+        # null values can not be compared, rule them out before the range check
+        in_range = np.zeros(len(column), dtype=bool)
+        in_range[valid] = self._range_mask(column[valid], field_name)
+        return in_range
+
+    def _criteria_fields(self) -> List[str]:
+        """Every field used by a criterion, once."""
+        return list(self.list_criteria) + [
+            f for f in self.range_criteria if f not in self.list_criteria
+        ]
+
+    def _filter_files_vectorized(self, file_list: List[Dict]) -> List[Dict]:
+        """
+        Evaluate the criteria as boolean masks over the whole file list, each
+        criterion only over the files that passed the previous ones.
+        Raise TypeError if the values cannot be compared column-wise.
+        """
+        # only the criteria fields are needed, missing keys become null
+        df = pd.DataFrame(file_list, columns=self._criteria_fields())
+        rows = np.arange(len(file_list))
 
-        return True
+        for kind, field_name in self._criteria:
+            if not len(rows):
+                break
+            column = df[field_name].take(rows)
+            rows = rows[self._criterion_mask(kind, field_name, column, file_list)]
+
+        return [file_list[i] for i in rows]
 
     def filter_files(self, file_list: List[Dict]) -> List[Dict]:
         """
@@ -213,18 +419,47 @@ class FileFilter:
             logger.warning("No files provided for filtering.")
             return []
 
+        if not self._predicates:
+            # no usable criteria, every file passes
+            logger.info(f"no criteria, all {len(file_list)} files passed.")
+            return list(file_list)
+
         logger.debug("filtering files...")
-        # parallel filtering
-        with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
-            results = list(executor.map(self._is_valid_file, file_list))
+        if len(file_list) > _CALIBRATION_THRESHOLD and len(self._predicates) > 1:
+            self._order_by_selectivity(file_list)
+
+        if self.num_threads <= 1:
+            try:
+                filtered_files = self._filter_files_vectorized(file_list)
+            except TypeError:
+                # mixed or incomparable values, fall back to the per-file check
+                filtered_files = [f for f in file_list if self._is_valid_file(f)]
+        else:
+            # parallel filtering, chunked so pickling is amortized over many files
+            chunksize = max(1, len(file_list) // (4 * self.num_threads))
+            with ProcessPoolExecutor(max_workers=self.num_threads) as executor:
+                results = list(
+                    executor.map(self._is_valid_file, file_list, chunksize=chunksize)
+                )
 
-        # filter the files according to the results
-        filtered_files = [f for f, valid in zip(file_list, results) if valid]
+            # filter the files according to the results
+            filtered_files = [f for f, valid in zip(file_list, results) if valid]
 
         logger.info(f"filtering finished, {len(filtered_files)} files passed.")
 
         return filtered_files
 
+    def iter_filter(self, records: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        Lazily filter `records`, yielding only the ones that pass the criteria.
+        """
+        if not self._predicates:
+            yield from records
+            return
+        for file_info in records:
+            if self._is_valid_file(file_info):
+                yield file_info
+
     def show_criteria(self) -> None:
         logger.debug("===== Filter Criteria Summary =====")
 
@@ -1,14 +1,99 @@
 import os
 import re
+import pickle
 import logging
-from concurrent.futures import ThreadPoolExecutor
-from typing import List, Dict, Optional
+import threading
+from functools import lru_cache
+from itertools import islice
+from sys import intern
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Iterator, Iterable, Sequence, Union
 from datetime import datetime, timedelta
 
+from .pattern_utils import compile_regex_pattern, compile_hyperscan_prefilter
+
+try:
+    # optional: RE2 is a linear-time DFA engine, much faster than `re` on long paths
+    import re2
+except ImportError:
+    re2 = None
+
+try:
+    # optional: Hyperscan pre-filter, see `compile_hyperscan_prefilter`
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
 # Create a logger
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=256)
+def _compile_re2(regex_pattern: str):
+    """Compile `regex_pattern` with RE2, or return None if RE2 is unavailable or rejects it."""
+    if re2 is None:
+        return None
+    try:
+        return re2.compile(regex_pattern)
+    except Exception as e:
+        logger.debug(f"RE2 can not compile {regex_pattern}, using re: {e}")
+        return None
+
+
+def _on_prefilter_match(match_id, start, end, flags, context) -> None:
+    """Hyperscan match callback, flags the scanned path as a candidate."""
+    context[0] = True
+
+
+@lru_cache(maxsize=256)
+def _jan1(year: int) -> datetime:
+    """January 1st of `year`, shared by all files of the same year."""
+    return datetime(year, 1, 1)
+
+
+# number of paths sent to a pool worker at once
+_BATCH_SIZE = 4096
+
+# the matcher of a pool worker, built once by `_init_worker`
+_WORKER_MATCHER: Optional["FileMatcher"] = None
+
+
+def _init_worker(matcher_cls: type, directory: str, regex_pattern: str) -> None:
+    """
+    Process pool initializer: compile the pattern once per worker.
+    Only the class and the pattern string are pickled, never the matcher itself.
+    """
+    global _WORKER_MATCHER
+    _WORKER_MATCHER = matcher_cls(directory, regex_pattern)
+
+
+def _match_batch(file_paths: List[str]) -> List[Dict]:
+    """Process pool worker: match a batch of paths, keep only the matched ones."""
+    match_file = _WORKER_MATCHER._match_file
+    return [fields for fields in map(match_file, file_paths) if fields]
+
+
+def _intern_records(records: List[Dict]) -> None:
+    """
+    Intern the field values of records unpickled from the process pool or
+    a manifest, interning does not survive pickling.
+    """
+    for fields in records:
+        for name, value in fields.items():
+            if name != "path" and type(value) is str:
+                fields[name] = intern(value)
+
+
+def _batched(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    """Split `items` into lists of at most `size` items, consuming it lazily."""
+    it = iter(items)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
 class FileMatcher:
     """_summary_
     A class-based approach for:
@@ -16,41 +101,121 @@ class FileMatcher:
     2. Matching each file against a regex pattern
     3. Extracting time fields and constructing datetime objects
     """
-    def __init__(self, directory: str, regex_pattern: str):
+    def __init__(
+        self,
+        directory: str,
+        regex_pattern: Union[str, re.Pattern],
+        dir_patterns: Sequence[str] = (),
+        min_depth: int = 0,
+    ):
         """
         :param directory: Root directory to walk through.
-        :param regex_pattern: Regex pattern with named groups for capturing fields.
+        :param regex_pattern: Regex pattern with named groups for capturing fields,
+                              as a string or already compiled.
+        :param dir_patterns: regex the directory names must match, one per depth
+                             below `directory`, see `build_walk_plan`.
+        :param min_depth: files less deep below `directory` are skipped.
         """
+        # compile once, reuse for every file
+        if isinstance(regex_pattern, re.Pattern):
+            self._regex = regex_pattern
+            regex_pattern = regex_pattern.pattern
+        else:
+            self._regex = compile_regex_pattern(regex_pattern)
         self.directory = directory
         self.regex_pattern = regex_pattern
         self.matched_files: List[Dict] = []
+        self._re2_regex = _compile_re2(regex_pattern)
+        self._prefilter = compile_hyperscan_prefilter(regex_pattern)
+        # the database is shared by every matcher of the pattern, but a scratch
+        # serves one scan at a time: each thread allocates its own
+        self._scratch = threading.local()
+        self._dir_patterns = tuple(dir_patterns)
+        self._dir_regexes = [compile_regex_pattern(p) for p in dir_patterns]
+        self._min_depth = min_depth
+        # which time fields the pattern can provide, resolved once per pattern
+        groups = self._regex.groupindex
+        self._has_jday = "year" in groups and "jday" in groups
+        self._has_ymd = "year" in groups and "month" in groups and "day" in groups
+        # named groups in pattern order, read by index from bytes matches
+        self._group_names = tuple(sorted(groups, key=groups.get))
+        self._group_ids = tuple(groups[name] for name in self._group_names)
+        # bytes twins of the regexes, so the walk can skip decoding every path
+        if regex_pattern.isascii():
+            bytes_pattern = regex_pattern.encode("ascii")
+            self._bytes_regex = _compile_re2(bytes_pattern) or compile_regex_pattern(bytes_pattern)
+            self._dir_regexes_b = [compile_regex_pattern(p.encode("ascii")) for p in dir_patterns]
+        else:
+            self._bytes_regex = None
+            self._dir_regexes_b = []
+
+    def _walk(self, root: str, depth: int = 0) -> Iterator[str]:
+        """
+        Recursively yield the file paths below `root`, `depth` levels below
+        `self.directory`.
+        Uses the cached dirent type from `os.scandir`, so no extra stat per entry.
+        Like `os.walk`, symlinked directories are not followed and unreadable
+        directories are skipped. Directories the pattern can not match are not
+        entered, and files above `min_depth` are not yielded.
+        """
+        files, subdirs = self._list_dir(root, depth)
+        yield from files
+        for subdir in subdirs:
+            yield from self._walk(subdir, depth + 1)
+
+    def _iter_paths(self) -> Iterator[Union[str, bytes]]:
+        """
+        Walk `self.directory`, with bytes paths when the pattern has a bytes
+        twin, only the matched paths are decoded then.
+        """
+        if self._bytes_regex is not None:
+            return self._walk(os.fsencode(self.directory))
+        return self._walk(self.directory)
 
     def get_files(self) -> List[str]:
         """
-        Recursively collect all files in `self.directory`.
+        Recursively collect the files in `self.directory` that may match the pattern.
         """
-        file_list = []
-        count = 0
         logger.info(f"Searching for files in {self.directory}")
-        for root, _, files in os.walk(self.directory):
-            for file_name in files:
-                file_list.append(os.path.join(root, file_name))
-                count += 1
-        logger.info(f"Finish. {count} files found in {self.directory}")
+        file_list = list(self._walk(self.directory))
+        logger.info(f"Finish. {len(file_list)} files found in {self.directory}")
         return file_list
 
     def match_files(self, file_paths: Optional[List[str]] = None, num_threads: int = 1) -> List[Dict]:
         """
         Match a list of files with `self.regex_pattern`, extract fields, and store them in `matched_files`.
-        If no file_paths is provided, we will call `get_files()` automatically.
+        If no file_paths is provided, the directory is walked automatically.
+        With num_threads > 1, batches of paths are matched in a process pool.
+
+        Each matched file is a plain dict of the pattern's named groups plus
+        "time" and "path". The keys depend on the pattern (custom fields), and
+        the records are consumed by key and by `pd.DataFrame`, so they are kept
+        as dicts rather than a fixed-slot record class.
         """
+        # Without file_paths the directory walk feeds the matching,
+        # so matching starts before the walk is over
         if file_paths is None:
-            file_paths = self.get_files()
-        logger.info("Start file pattern matching...")
+            logger.info(f"Searching and matching files in {self.directory}")
+            file_paths = self._iter_paths()
+        else:
+            logger.info("Start file pattern matching...")
 
-        # Use ThreadPoolExecutor to parallelize the matching process
-        with ThreadPoolExecutor(max_workers=num_threads) as executor:
-            results = list(executor.map(self._match_file, file_paths))
+        if num_threads <= 1:
+            results = [self._match_file(file_path) for file_path in file_paths]
+        else:
+            # regex matching holds the GIL, so parallelize across processes,
+            # feeding them batch by batch
+            with ProcessPoolExecutor(
+                max_workers=min(num_threads, os.cpu_count() or 1),
+                initializer=_init_worker,
+                initargs=(type(self), self.directory, self.regex_pattern),
+            ) as executor:
+                futures = [
+                    executor.submit(_match_batch, batch)
+                    for batch in _batched(file_paths, _BATCH_SIZE)
+                ]
+                results = [fields for future in futures for fields in future.result()]
+            _intern_records(results)
 
         # filter out None results
         all_results = [res for res in results if res]
@@ -58,16 +223,180 @@ class FileMatcher:
         self.matched_files = all_results  # store the matched files
         return all_results
     
-    def _match_file(self, file_path: str) -> Dict:
+    def match_files_cached(self, manifest_path: str, num_threads: int = 1) -> List[Dict]:
+        """
+        Same result as `match_files()`, but the matched records of every
+        directory are kept in a pickle manifest at `manifest_path`.
+        On the next call, a directory whose mtime did not change is not listed
+        nor matched again, its records and sub-directories come from the manifest.
+        Only new or changed directories are scanned, `num_threads` is used to
+        match their files.
+        """
+        key = (type(self).__qualname__, self.regex_pattern, self._dir_patterns, self._min_depth)
+        old_dirs = self._load_manifest(manifest_path, key)
+        # dir -> (mtime, records, sub-directories)
+        new_dirs: Dict[str, tuple] = {}
+        pending: Dict[str, List[str]] = {}
+
+        logger.info(f"Searching for changed directories in {self.directory}")
+        stack = [(self.directory, 0)]
+        while stack:
+            root, depth = stack.pop()
+            try:
+                mtime = os.stat(root).st_mtime_ns
+            except OSError as e:
+                logger.warning(f"Can not scan {root}: {e}")
+                continue
+            cached = old_dirs.get(root)
+            if cached is not None and cached[0] == mtime:
+                _intern_records(cached[1])
+                new_dirs[root] = cached
+                subdirs = cached[2]
+            else:
+                files, subdirs = self._list_dir(root, depth)
+                pending[root] = files
+                new_dirs[root] = (mtime, [], subdirs)
+            stack.extend((sub, depth + 1) for sub in reversed(subdirs))
+
+        changed = [path for files in pending.values() for path in files]
+        logger.info(f"{len(new_dirs) - len(pending)} directories unchanged, {len(changed)} files to match")
+        if changed:
+            owner = {path: root for root, files in pending.items() for path in files}
+            for fields in self.match_files(changed, num_threads=num_threads):
+                new_dirs[owner[fields["path"]]][1].append(fields)
+
+        self._save_manifest(manifest_path, key, new_dirs)
+        all_results = [fields for _, records, _ in new_dirs.values() for fields in records]
+        logger.info(f"{len(all_results)} files matched.")
+        self.matched_files = all_results
+        return all_results
+
+    def _list_dir(self, root: str, depth: int):
+        """
+        List one directory `depth` levels below `self.directory`.
+        Return (files, sub-directories) after pruning, see `_walk`.
+        """
+        regexes = self._dir_regexes_b if isinstance(root, bytes) else self._dir_regexes
+        dir_regex = regexes[depth] if depth < len(regexes) else None
+        files, subdirs = [], []
+        try:
+            with os.scandir(root) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        # non-ASCII names are left to the full regex, see `_match_file`
+                        if dir_regex is None or not entry.name.isascii() or dir_regex.match(entry.name):
+                            subdirs.append(entry.path)
+                    elif not entry.is_dir() and depth + 1 >= self._min_depth:
+                        files.append(entry.path)
+        except OSError as e:
+            logger.warning(f"Can not scan {root}: {e}")
+        return files, subdirs
+
+    @staticmethod
+    def _load_manifest(manifest_path: str, key: tuple) -> Dict[str, tuple]:
+        """Directories of a manifest written for the same matcher, else empty."""
+        try:
+            with open(manifest_path, "rb") as f:
+                manifest = pickle.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Can not read manifest {manifest_path}, rescanning: {e}")
+            return {}
+        if not isinstance(manifest, dict) or manifest.get("key") != key:
+            logger.info(f"Manifest {manifest_path} is for another pattern, rescanning")
+            return {}
+        return manifest["dirs"]
+
+    @staticmethod
+    def _save_manifest(manifest_path: str, key: tuple, dirs: Dict[str, tuple]) -> None:
+        """Write the manifest atomically, a failure only costs a rescan next time."""
+        tmp_path = f"{manifest_path}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump({"key": key, "dirs": dirs}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, manifest_path)
+        except OSError as e:
+            logger.warning(f"Can not write manifest {manifest_path}: {e}")
+
+    def iter_match_files(self, file_iter: Optional[Iterable[str]] = None) -> Iterator[Dict]:
+        """
+        Lazily match file paths, yielding one matched dict at a time.
+        If no file_iter is provided, the directory is walked on the fly.
+        Nothing is stored in `matched_files`.
+        """
+        if file_iter is None:
+            file_iter = self._iter_paths()
+        for file_path in file_iter:
+            fields = self._match_file(file_path)
+            if fields:
+                yield fields
+
+    def _may_match(self, file_path: Union[str, bytes]) -> bool:
+        """Cheap Hyperscan check, False means the regex can not match `file_path`."""
+        if isinstance(file_path, str):
+            file_path = file_path.encode("ascii")
+        scratch = getattr(self._scratch, "space", None)
+        if scratch is None:
+            scratch = self._scratch.space = hyperscan.Scratch(self._prefilter)
+        hit = [False]
+        try:
+            self._prefilter.scan(
+                file_path, match_event_handler=_on_prefilter_match,
+                context=hit, scratch=scratch,
+            )
+        except hyperscan.error as e:
+            # never drop a file because of the pre-filter, let the regex decide
+            logger.debug(f"Hyperscan scan failed on {file_path!r}, using the regex: {e}")
+            return True
+        return hit[0]
+
+    def _match_bytes(self, file_path: bytes) -> Dict:
+        """`_match_file` for an ASCII bytes path, only a match is decoded."""
+        if self._prefilter is not None and not self._may_match(file_path):
+            return {}
+        match = self._bytes_regex.match(file_path)
+        if not match:
+            return {}
+        ids = self._group_ids
+        values = match.group(*ids) if len(ids) > 1 else tuple(match.group(i) for i in ids)
+        fields = {
+            name: None if value is None else intern(value.decode("ascii"))
+            for name, value in zip(self._group_names, values)
+        }
+        fields["time"] = self._gen_time_from_fields(fields)
+        fields["path"] = file_path.decode("ascii")
+        return fields
+
+    def _match_file(self, file_path: Union[str, bytes]) -> Dict:
         """
         Match a single file path against the regex_pattern,
         and parse its time fields if present.
+        Bytes paths come from the walk, non-ASCII ones are decoded and
+        matched as str, where the character classes keep their Unicode meaning.
         """
         fields = {}
         try:
-            match = re.match(self.regex_pattern, file_path)
+            if isinstance(file_path, bytes):
+                if self._bytes_regex is not None and file_path.isascii():
+                    return self._match_bytes(file_path)
+                file_path = os.fsdecode(file_path)
+            # RE2 and Hyperscan character classes are ASCII only,
+            # keep `re` for other paths
+            if file_path.isascii():
+                if self._prefilter is not None and not self._may_match(file_path):
+                    return fields
+                regex = self._re2_regex or self._regex
+            else:
+                regex = self._regex
+            match = regex.match(file_path)
             if match:
-                fields = match.groupdict()
+                # the same few station / component / date strings repeat over
+                # many files, share one object per value
+                fields = {
+                    name: None if value is None else intern(value)
+                    for name, value in match.groupdict().items()
+                }
                 # parse time fields if they exist
                 fields["time"] = self._gen_time_from_fields(fields)
                 # store path
@@ -81,39 +410,31 @@ class FileMatcher:
         Construct a datetime object from year/month/day/jday/hour/minute fields in the dict.
         If invalid or incomplete, return None (or raise an error).
         """
-        # extract fields
-        year = fields.get("year")
-        month = fields.get("month")
-        day = fields.get("day")
-        jday = fields.get("jday")
-        hour = fields.get("hour", "0")
-        minute = fields.get("minute", "0")
-
-        # convert year to int
-        if year is not None:
-            if len(year) == 2:
-                year = 2000 + int(year)
-            else:
-                year = int(year)
+        if not (self._has_jday or self._has_ymd):
+            logger.error(f"Insufficient time fields: {fields}")
+            return None
 
-        # convert other fields to int
-        jday = int(jday) if jday else None
-        month = int(month) if month else None
-        day = int(day) if day else None
-        hour = int(hour)
-        minute = int(minute)
+        # convert year to int, an optional year group may not have matched
+        year = fields.get("year")
+        if year is None:
+            logger.error(f"Insufficient time fields: {fields}")
+            return None
+        year = 2000 + int(year) if len(year) == 2 else int(year)
+        hour = int(fields.get("hour") or 0)
+        minute = int(fields.get("minute") or 0)
+        jday = int(fields["jday"] or 0) if self._has_jday else 0
 
-        if year and jday:
+        if jday:
             # calculate time from year and jday
             try:
-                return datetime(year, 1, 1) + timedelta(days=jday - 1, hours=hour, minutes=minute)
+                return _jan1(year) + timedelta(days=jday - 1, hours=hour, minutes=minute)
             except ValueError as e:
                 logger.error(f"Invalid jday or date fields: {fields}, error: {e}")
                 return None
-        elif year and month and day:
+        elif self._has_ymd and fields["month"] and fields["day"]:
             # calculate time from year, month, and day
             try:
-                return datetime(year, month, day, hour, minute)
+                return datetime(year, int(fields["month"]), int(fields["day"]), hour, minute)
             except ValueError as e:
                 logger.error(f"Invalid date fields: {fields}, error: {e}")
                 return None
@@ -2,16 +2,27 @@ from collections import defaultdict
 import pandas as pd
 
 
-def group_by_labels(matched_files, labels, sort_labels):
+def _to_frame(matched_files):
     """
-    Organize the matched files into a multi-level dictionary according to the order.
-
-    matched_files: a list of file paths, every file is a dictionary contains fields and path
+    One column per field, `matched_files` may already be a DataFrame.
     """
+    if isinstance(matched_files, pd.DataFrame):
+        if matched_files.empty:
+            raise ValueError("No files matched. Matching First!.")
+        return matched_files
     if not matched_files:
         raise ValueError("No files matched. Matching First!.")
+    return pd.DataFrame(matched_files)
 
-    df = pd.DataFrame(matched_files)
+
+def group_by_labels(matched_files, labels, sort_labels):
+    """
+    Organize the matched files into a multi-level dictionary according to the order.
+
+    matched_files: a list of file paths, every file is a dictionary contains fields and path,
+                   or a DataFrame with one column per field
+    """
+    df = _to_frame(matched_files)
 
     # Check if all the keys in order are in fields of file_info
     if not all(field in df.columns for field in labels):
@@ -43,16 +54,15 @@ def add_path(multi_dict, keys, value):
 
 
 def organize_by_labels(matched_files, order, information_type):
-    if not matched_files:
-        raise ValueError("No files matched. Matching First!.")
+    df = _to_frame(matched_files)
     if information_type not in ['path', 'dict']:
         raise ValueError("The information_type should be 'path' or 'dict'")
-    df = pd.DataFrame(matched_files)
     multi_dict = recursive_defaultdict()
-    for _, row in df.iterrows():
-        keys = [row[field] for field in order]
-        if information_type == 'path':
-            add_path(multi_dict, keys, row['path'])
-        elif information_type == 'dict':
-            add_path(multi_dict, keys, row.to_dict())
+    # walk the columns instead of building a Series per row
+    if information_type == 'path':
+        values = df['path'].tolist()
+    else:
+        values = df.to_dict(orient='records')
+    for keys, value in zip(zip(*(df[field].tolist() for field in order)), values):
+        add_path(multi_dict, keys, value)
     return multi_dict
@@ -1,12 +1,36 @@
 import os
 import re
 import logging
-from typing import Dict
-from collections import OrderedDict, Counter
-import logging
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Tuple, Union
+
+try:
+    # optional: Hyperscan runs a pattern as a compiled DFA, used as a pre-filter
+    import hyperscan
+except ImportError:
+    hyperscan = None
 
 logger = logging.getLogger(__name__)
 
+# a "{field}" placeholder in a pattern, group 1 is the field name
+FIELD_RE = re.compile(r"\{(\w+)\}")
+# a pattern needs at least one of these to build a time
+_DATE_TOKENS = ("{YYYY}", "{YY}", "{JJJ}", "{MM}", "{DD}")
+# a named group opening "(?P<name>", Hyperscan does not capture
+_NAMED_GROUP_RE = re.compile(r"\(\?P<\w+>")
+# escape the path separators of a pattern in a single pass
+_ESCAPE_TABLE = str.maketrans({".": r"\.", "_": r"\_", "/": r"\/"})
+# regex text that can never match a "/", once escaped by `_ESCAPE_TABLE`:
+# no wildcards, no negated classes or \S \W \D, no lookarounds and no "\."
+# (which the escaping turns into a backslash followed by any character)
+_SEPARATOR_FREE_RE = re.compile(
+    r"(?:\\[wdsb_-]"
+    r"|\(\?:"
+    r"|[\w.|()?+*{}, -]"
+    r"|\[(?:\\[wd_-]|[A-Za-z0-9]-[A-Za-z0-9]|[\w.-])+\]"
+    r")*"
+)
+
 
 class FieldRegistry:
     def __init__(self, base_fields: Dict[str, str]):
@@ -16,10 +40,17 @@ class FieldRegistry:
             base_fields (Dict[str, str]):
             as "YYYY": r"(?P<year>\d{4})",  # 4 digits for year
         """
-        if base_fields is None:
-            base_fields = {}  # empty dictionary
-        # copy the base fields
-        self._fields = OrderedDict(base_fields)
+        # copy the base fields, plain dicts keep insertion order
+        self._fields = dict(base_fields) if base_fields else {}
+        self._refresh()
+
+    def _refresh(self):
+        """
+        Rebuild the hashable views of the fields, used as cache keys by
+        `build_regex_pattern` and the pattern checks, after every change.
+        """
+        self._items = tuple(self._fields.items())
+        self._names = frozenset(self._fields)
 
     def add_field(self, field_name: str, regex_str: str, overwrite: bool = False):
         """_summary_
@@ -45,6 +76,7 @@ class FieldRegistry:
             raise ValueError(f"Invalid regex pattern: {e}")
 
         self._fields[field_name] = named_group
+        self._refresh()
 
     def remove_field(self, field_name: str):
         """_summary_
@@ -54,24 +86,23 @@ class FieldRegistry:
         """
         if field_name in self._fields:
             del self._fields[field_name]
+            self._refresh()
         else:
             logger.warning("Field %s not found.", field_name)
 
     def get_fields(self):
         return self._fields
 
-    def validate_pattern_fields(self, pattern: str):
+    def validate_pattern_fields(self, pattern: str) -> List[str]:
         """_summary_
 
         Args:
             pattern (str):
+
+        Returns:
+            List[str]: the fields found in the pattern, in order
         """
-        pattern_fields = set(re.findall(r"\{(\w+)}", pattern))
-        valid_fields = set(self._fields.keys())
-        if not pattern_fields.issubset(valid_fields):
-            invalid_fields = pattern_fields - valid_fields
-            logger.error("Pattern contains invalid fields: %s", invalid_fields)
-            raise ValueError(f"pattern contains invalid fields: {invalid_fields}")
+        return _validate_pattern_fields(pattern, self._names)
 
     def build_regex_pattern(self, pattern: str):
         """_summary_
@@ -79,75 +110,128 @@ class FieldRegistry:
         Args:
             pattern (str):
         """
-        # Replace field names with corresponding regex patterns
-        for field_name, regex in self._fields.items():
-            pattern = pattern.replace("{" + field_name + "}", regex)
-        # Escape special characters and compile the final regex pattern
-        pattern = pattern.replace(".", r"\.")
-        pattern = pattern.replace("_", r"\_")
-        pattern = pattern.replace("/", r"\/")
-        # Replace '?' (any character wildcard) with regex for any characters except for special characters
-        pattern = pattern.replace("{?}", "[^. _/]*")
-        # Replace '*'(any character wildcard) with regex for any characters
-        pattern = pattern.replace("{*}", ".*")
-        return r"{}".format(pattern)
+        return _build_regex_pattern(pattern, self._items)
+
+
+def _validate_pattern_fields(pattern: str, valid_fields: FrozenSet[str]) -> List[str]:
+    """
+    Raise ValueError if `pattern` uses a field that is not in `valid_fields`,
+    otherwise return the fields found in the pattern, in order.
+    """
+    pattern_fields_list = FIELD_RE.findall(pattern)
+    invalid_fields = set(pattern_fields_list) - valid_fields
+    if invalid_fields:
+        logger.error("Pattern contains invalid fields: %s", invalid_fields)
+        raise ValueError(f"pattern contains invalid fields: {invalid_fields}")
+    return pattern_fields_list
+
+
+@lru_cache(maxsize=128)
+def _build_regex_pattern(pattern: str, fields: Tuple[Tuple[str, str], ...]) -> str:
+    """
+    Cached worker of `FieldRegistry.build_regex_pattern`, keyed by the pattern
+    and the registered (field_name, regex) items.
+    """
+    # Replace field names with corresponding regex patterns in one scan,
+    # unknown placeholders are kept as they are
+    fields = dict(fields)
+    pattern = FIELD_RE.sub(lambda m: fields.get(m.group(1), m.group(0)), pattern)
+    # Escape special characters and compile the final regex pattern
+    pattern = pattern.translate(_ESCAPE_TABLE)
+    # Replace '?' (any character wildcard) with regex for any characters except for special characters
+    pattern = pattern.replace("{?}", "[^. _/]*")
+    # Replace '*'(any character wildcard) with regex for any characters
+    pattern = pattern.replace("{*}", ".*")
+    return r"{}".format(pattern)
 
 # making this a global variable
-DEFAULT_BASE_FIELDS = OrderedDict(
-    {
-        "YYYY": r"(?P<year>\d{4})",  # 4 digits for year
-        "YY": r"(?P<year>\d{2})",  # 2 digits for year
-        "MM": r"(?P<month>\d{2})",  # 2 digits for month
-        "DD": r"(?P<day>\d{2})",  # 2 digits for day
-        "JJJ": r"(?P<jday>\d{3})",  # 3 digits for day of year
-        "HH": r"(?P<hour>\d{2})",  # 2 digits for hour
-        "MI": r"(?P<minute>\d{2})",  # 2 digits for minute
-        "home": r"(?P<home>[A-Za-z0-9/_-]+)",  # for home directory
-        "network": r"(?P<network>\w+)",  # for network code
-        "event": r"(?P<event>\w+)",  # for network code
-        "station": r"(?P<station>\w+)",  # for station name
-        "component": r"(?P<component>\w+)",  # for component name
-        "sampleF": r"(?P<sampleF>\w+)",  # for sampling frequency
-        "quality": r"(?P<quality>\w+)",  # for quality indicator
-        "locid": r"(?P<locid>\w+)",  # for location ID
-        "suffix": r"(?P<suffix>\w+)",  # for file extension
-        "label0": r"(?P<label0>\w+)",  # for file label0
-        "label1": r"(?P<label1>\w+)",  # for file label1
-        "label2": r"(?P<label2>\w+)",  # for file label2
-        "label3": r"(?P<label3>\w+)",  # for file label3
-        "label4": r"(?P<label4>\w+)",  # for file label4
-        "label5": r"(?P<label5>\w+)",  # for file label5
-        "label6": r"(?P<label6>\w+)",  # for file label6
-        "label7": r"(?P<label7>\w+)",  # for file label7
-        "label8": r"(?P<label8>\w+)",  # for file label8
-        "label9": r"(?P<label9>\w+)",  # for file label9
-    }
-)
+DEFAULT_BASE_FIELDS = {
+    "YYYY": r"(?P<year>\d{4})",  # 4 digits for year
+    "YY": r"(?P<year>\d{2})",  # 2 digits for year
+    "MM": r"(?P<month>\d{2})",  # 2 digits for month
+    "DD": r"(?P<day>\d{2})",  # 2 digits for day
+    "JJJ": r"(?P<jday>\d{3})",  # 3 digits for day of year
+    "HH": r"(?P<hour>\d{2})",  # 2 digits for hour
+    "MI": r"(?P<minute>\d{2})",  # 2 digits for minute
+    "home": r"(?P<home>[A-Za-z0-9/_-]+)",  # for home directory
+    "network": r"(?P<network>\w+)",  # for network code
+    "event": r"(?P<event>\w+)",  # for network code
+    "station": r"(?P<station>\w+)",  # for station name
+    "component": r"(?P<component>\w+)",  # for component name
+    "sampleF": r"(?P<sampleF>\w+)",  # for sampling frequency
+    "quality": r"(?P<quality>\w+)",  # for quality indicator
+    "locid": r"(?P<locid>\w+)",  # for location ID
+    "suffix": r"(?P<suffix>\w+)",  # for file extension
+    "label0": r"(?P<label0>\w+)",  # for file label0
+    "label1": r"(?P<label1>\w+)",  # for file label1
+    "label2": r"(?P<label2>\w+)",  # for file label2
+    "label3": r"(?P<label3>\w+)",  # for file label3
+    "label4": r"(?P<label4>\w+)",  # for file label4
+    "label5": r"(?P<label5>\w+)",  # for file label5
+    "label6": r"(?P<label6>\w+)",  # for file label6
+    "label7": r"(?P<label7>\w+)",  # for file label7
+    "label8": r"(?P<label8>\w+)",  # for file label8
+    "label9": r"(?P<label9>\w+)",  # for file label9
+}
 
 
-def check_pattern(array_dir: str, pattern: str, registry: FieldRegistry) -> str:
+@lru_cache(maxsize=256)
+def compile_regex_pattern(regex_pattern: Union[str, bytes]) -> re.Pattern:
     """
-    Check if pattern is a valid string and return a dictionary with
+    Compile a regex built by `check_pattern`, or its bytes form. Cached, so
+    every SeisArray or FileMatcher with the same pattern shares one compiled object.
     """
+    return re.compile(regex_pattern)
+
+
+@lru_cache(maxsize=64)
+def compile_hyperscan_prefilter(regex_pattern: str):
+    """
+    Compile a Hyperscan block-mode database that accepts the (ASCII) paths
+    `re.match(regex_pattern, path)` would match. Hyperscan can not capture
+    groups, so the groups are made non-capturing and the caller still runs the
+    regex on accepted paths to extract the fields.
+    Cached, the read-only database is shared: scan it with a scratch of your
+    own (`hyperscan.Scratch(db)`), one per thread.
+    Return None if Hyperscan is not installed or rejects the pattern.
+    """
+    if hyperscan is None:
+        return None
+    expression = "^" + _NAMED_GROUP_RE.sub("(?:", regex_pattern)
+    try:
+        db = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+        db.compile(
+            expressions=[expression.encode("ascii")],
+            ids=[0],
+            flags=[hyperscan.HS_FLAG_SINGLEMATCH],
+        )
+    except Exception as e:
+        logger.debug("Hyperscan can not compile %s: %s", regex_pattern, e)
+        return None
+    return db
 
-    if not isinstance(pattern, str):
-        logger.error("Pattern must be a string, but got %s", type(pattern))
-        raise TypeError("pattern must be a string")
 
+@lru_cache(maxsize=128)
+def _check_pattern_fields(pattern: str, field_names: FrozenSet[str]) -> None:
+    """
+    Validate the fields used by `pattern`, raise ValueError if it is invalid.
+    Cached, so repeated patterns are only checked once.
+    """
     # check if all fields in the pattern are valid
-    registry.validate_pattern_fields(pattern)
+    pattern_fields_list = _validate_pattern_fields(pattern, field_names)
 
-    # avoid duplicate fields
-    pattern_fields_list = re.findall(r"\{(\w+)}", pattern)
-    field_counts = Counter(pattern_fields_list)
-    duplicate_fields = [field for field, count in field_counts.items() if count > 1]
+    # avoid duplicate fields, reusing the fields found above
+    seen = set()
+    duplicate_fields = []
+    for field in pattern_fields_list:
+        if field not in seen:
+            seen.add(field)
+        elif field not in duplicate_fields:
+            duplicate_fields.append(field)
     if duplicate_fields:
         logger.error("Pattern contains duplicate fields: %s", duplicate_fields)
         raise ValueError(f"pattern contains duplicate fields: {duplicate_fields}")
 
-    if not isinstance(pattern, str):
-        raise TypeError("pattern must be a string")
-
     # check if necessary fields are in the pattern
     necessary_fields = ["{home}", "{component}", "{station}"]
     for f in necessary_fields:
@@ -156,17 +240,23 @@ def check_pattern(array_dir: str, pattern: str, registry: FieldRegistry) -> str:
             raise ValueError(f"pattern must contain {f}")
 
     # check if one of the date fields is in the pattern
-    date_fields0 = ["{YYYY}", "{MM}", "{DD}"]
-    date_fields1 = ["{YYYY}", "{JJJ}"]
-    date_fields2 = ["{YY}", "{MM}", "{DD}"]
-    date_fields3 = ["{YY}", "{JJJ}"]
-    if not any(
-        field in pattern
-        for field in date_fields0 + date_fields1 + date_fields2 + date_fields3
-    ):
+    if not any(token in pattern for token in _DATE_TOKENS):
         logger.error("Pattern must contain one set of date fields.")
         raise ValueError("pattern must contain one set of date fields")
 
+
+def check_pattern(array_dir: str, pattern: str, registry: FieldRegistry) -> str:
+    """
+    Check if pattern is a valid string and return a dictionary with
+    """
+
+    if not isinstance(pattern, str):
+        logger.error("Pattern must be a string, but got %s", type(pattern))
+        raise TypeError("pattern must be a string")
+
+    # the field checks only depend on the pattern and the registered field names
+    _check_pattern_fields(pattern, registry._names)
+
     # check is sac_dir is a dir, else warning
     if not os.path.isdir(array_dir):
         logger.error("%s is not a directory", array_dir)
@@ -177,3 +267,48 @@ def check_pattern(array_dir: str, pattern: str, registry: FieldRegistry) -> str:
     # Create the regex pattern
     regex_pattern = registry.build_regex_pattern(pattern)
     return regex_pattern
+
+
+
+def _is_separator_free(segment: str, fields: Dict[str, str]) -> bool:
+    """True if no part of the pattern `segment` can match across a "/"."""
+    if "{*}" in segment:
+        return False
+    for name in FIELD_RE.findall(segment):
+        if name == "home" or name not in fields:
+            return False
+        if not _SEPARATOR_FREE_RE.fullmatch(_NAMED_GROUP_RE.sub("(", fields[name])):
+            return False
+    literal = FIELD_RE.sub("", segment.replace("{?}", ""))
+    return _SEPARATOR_FREE_RE.fullmatch(literal) is not None
+
+
+def build_walk_plan(pattern: str, registry: FieldRegistry) -> Tuple[Tuple[str, ...], int]:
+    """
+    Work out which directories below {home} can hold files matching `pattern`.
+
+    Return (dir_patterns, min_depth): a directory at depth i + 1 below {home}
+    can only lead to a match if `dir_patterns[i]` matches its name, the list
+    stops at the first segment that may span several directories (e.g. "{*}").
+    Each "/" of the pattern is literal, so a matching file is at least
+    `min_depth` levels below {home}.
+    """
+    if not pattern.startswith("{home}/"):
+        return (), 0
+    segments = pattern[len("{home}/"):].split("/")
+    fields = registry.get_fields()
+
+    dir_patterns = []
+    for i, segment in enumerate(segments):
+        if not segment or not _is_separator_free(segment, fields):
+            break
+        regex = _NAMED_GROUP_RE.sub("(?:", registry.build_regex_pattern(segment))
+        # the last segment is matched as a prefix, like the full pattern
+        if i < len(segments) - 1:
+            regex += r"\Z"
+        try:
+            re.compile(regex)
+        except re.error:
+            break
+        dir_patterns.append(regex)
+    return tuple(dir_patterns), len(segments)
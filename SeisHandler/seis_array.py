@@ -1,10 +1,17 @@
 from typing import Dict, List, Optional
-from collections import OrderedDict
-from .pattern_utils import FieldRegistry, DEFAULT_BASE_FIELDS, check_pattern
+from operator import itemgetter
+from .pattern_utils import (
+    FieldRegistry,
+    DEFAULT_BASE_FIELDS,
+    build_walk_plan,
+    check_pattern,
+    compile_regex_pattern,
+)
 from .file_matcher import FileMatcher
 from .file_filter import FileFilter
 from .file_organizer import group_by_labels, organize_by_labels
 import logging
+import pandas as pd
 
 logger = logging.getLogger(__name__)
 
@@ -28,8 +35,8 @@ class SeisArray:
                               {"shot": r"\d+", "line": r"[A-Z0-9]+"}
         :param overwrite: when adding custom fields, overwrite the existing fields
         """
-        base_copy = OrderedDict(DEFAULT_BASE_FIELDS)
-        self.registry = FieldRegistry(base_copy)
+        # FieldRegistry keeps its own copy, the defaults are never mutated
+        self.registry = FieldRegistry(DEFAULT_BASE_FIELDS)
 
         if custom_fields:
             # add custom fields to the registry
@@ -37,20 +44,51 @@ class SeisArray:
                 self.registry.add_field(field_name, regex_str, overwrite=overwrite)
 
         self.array_dir = array_dir
-        self.pattern = check_pattern(array_dir, pattern, self.registry)
+        self.pattern = self._check_pattern(pattern)
+        self.regex = compile_regex_pattern(self.pattern)
+        # directories worth walking, derived from the pattern segments below {home}
+        self.dir_patterns, self.min_depth = build_walk_plan(pattern, self.registry)
         self.files = None
         self.filtered_files = None
         self.pattern_filter = None
         self.files_group = None
         self.virtual_array = None
+        # DataFrame views of files / filtered_files, see `_frame`
+        self._frames = {}
 
-    def match(self, threads: int = 1):
+    def _check_pattern(self, pattern: str) -> str:
+        """
+        Validate `pattern` against the registry and return its regex string,
+        subclasses may relax the checks.
+        """
+        return check_pattern(self.array_dir, pattern, self.registry)
+
+    def _make_matcher(self) -> FileMatcher:
+        """
+        FileMatcher used by `match` and `match_and_filter`, subclasses may
+        return a FileMatcher subclass.
+        """
+        return FileMatcher(
+            directory=self.array_dir,
+            regex_pattern=self.regex,
+            dir_patterns=self.dir_patterns,
+            min_depth=self.min_depth,
+        )
+
+    def match(self, threads: int = 1, manifest: Optional[str] = None):
         """
         Matching files in array_dir using FileMatcher according to self.pattern.
         The matched info is stored in self.files.
+
+        :param manifest: path of a manifest file, if given only the directories
+                         changed since the previous run are scanned again
         """
-        matcher = FileMatcher(directory=self.array_dir, regex_pattern=self.pattern)
-        self.files = matcher.match_files(num_threads=threads)
+        matcher = self._make_matcher()
+        if manifest is None:
+            self.files = matcher.match_files(num_threads=threads)
+        else:
+            self.files = matcher.match_files_cached(manifest, num_threads=threads)
+        self._frames.clear()
 
     def filter(
         self,
@@ -95,6 +133,27 @@ class SeisArray:
         if verbose:
             file_filter.show_criteria()
         self.filtered_files = file_filter.filter_files(self.files)
+        self._frames.pop(True, None)
+
+    def match_and_filter(
+        self,
+        criteria: Optional[Dict[str, List]] = None,
+        verbose: bool = False,
+    ):
+        """
+        Match and filter in one streaming pass, only the files passing the
+        criteria are kept in memory. The result is stored in self.filtered_files,
+        self.files is left untouched.
+
+        :param criteria: same as `filter`
+        """
+        matcher = self._make_matcher()
+        file_filter = FileFilter(criteria=criteria)
+        if verbose:
+            file_filter.show_criteria()
+        self.filtered_files = list(file_filter.iter_filter(matcher.iter_match_files()))
+        self._frames.pop(True, None)
+        logger.info(f"{len(self.filtered_files)} files matched and passed the filter.")
 
     def group(self, labels: list, sort_labels: list = None, filtered=True):
         """
@@ -112,7 +171,7 @@ class SeisArray:
                 logger.error("Please match the files first.")
             return None
 
-        files_group = group_by_labels(files, labels, sort_labels)
+        files_group = group_by_labels(self._frame(filtered), labels, sort_labels)
         self.files_group = files_group.to_dict(orient="index")
 
     def organize(self, label_order: list, output_type="dict", filtered=True):
@@ -134,24 +193,29 @@ class SeisArray:
         if output_type not in ["path", "dict"]:
             logger.error("[Error] flag should be 'path' or 'dict'.")
             output_type = "dict"
-        self.virtual_array = organize_by_labels(files, label_order, output_type)
+        self.virtual_array = organize_by_labels(self._frame(filtered), label_order, output_type)
+
+    def _frame(self, filtered: bool) -> pd.DataFrame:
+        """
+        Columnar view of self.filtered_files (or self.files), built once and
+        shared by `group` and `organize` until the list is replaced.
+        """
+        files = self.filtered_files if filtered else self.files
+        cached = self._frames.get(filtered)
+        if cached is None or cached[0] is not files:
+            cached = self._frames[filtered] = (files, pd.DataFrame(files))
+        return cached[1]
 
     def get_stations(self, filtered: bool = True) -> list:
-        station_set = []
         if filtered:
             files = self.filtered_files
         else:
             files = self.files
-        for file_info in files:
-            station_set.append(file_info["station"])
-        return station_set
-    
+        return list(map(itemgetter("station"), files))
+
     def get_times(self, filtered: bool = True) -> list:
-        time_set = []
         if filtered:
             files = self.filtered_files
         else:
             files = self.files
-        for file_info in files:
-            time_set.append(file_info["time"])
-        return time_set
+        return list(map(itemgetter("time"), files))
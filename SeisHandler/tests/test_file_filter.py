@@ -0,0 +1,121 @@
+import unittest
+from datetime import datetime
+
+from SeisHandler.file_filter import FileFilter
+
+
+class TestFileFilter(unittest.TestCase):
+
+    def setUp(self):
+        """
+        run at the beginning of each test method.
+        """
+        self.files = [
+            {"station": "ABC", "component": "BHZ", "time": datetime(2023, 1, 1), "path": "a"},
+            {"station": "ABC", "component": "BHN", "time": datetime(2023, 1, 2), "path": "b"},
+            {"station": "XYZ", "component": "BHZ", "time": datetime(2023, 1, 3), "path": "c"},
+            {"station": "XYZ", "component": "BHZ", "time": None, "path": "d"},
+            {"station": "DEF", "path": "e"},
+        ]
+        self.criteria = {
+            "station": {"type": "list", "data_type": "str", "value": ["ABC", "XYZ"]},
+            "time": {
+                "type": "range",
+                "data_type": "datetime",
+                "value": [
+                    datetime(2023, 1, 1), datetime(2023, 1, 1, 12),
+                    datetime(2023, 1, 3), datetime(2023, 1, 4),
+                ],
+            },
+        }
+
+    def test_vectorized_matches_per_file_check(self):
+        """
+        the vectorized filter should keep the same files as `_is_valid_file`
+        """
+        files = self.files + [
+            {"station": None, "component": "BHZ", "time": datetime(2023, 1, 1, 6), "path": "f"},
+            {"component": "BHZ", "time": datetime(2023, 1, 3, 6), "path": "g"},
+        ]
+        untyped = dict(self.criteria, station={"type": "list", "value": ["ABC", None]})
+        for criteria, paths in ((self.criteria, ["a", "c"]), (untyped, ["a", "f"])):
+            file_filter = FileFilter(criteria)
+            expected = [f["path"] for f in files if file_filter._is_valid_file(f)]
+            result = [f["path"] for f in file_filter._filter_files_vectorized(files)]
+            self.assertEqual(result, expected)
+            self.assertEqual(result, paths)
+            pooled = FileFilter(criteria, num_threads=2).filter_files(files)
+            self.assertEqual([f["path"] for f in pooled], paths)
+
+    def test_missing_field_is_rejected(self):
+        """
+        files without a criteria field never pass
+        """
+        criteria = {"component": {"type": "list", "value": ["BHZ", "BHN"]}}
+        result = FileFilter(criteria).filter_files(self.files)
+        self.assertEqual([f["path"] for f in result], ["a", "b", "c", "d"])
+
+    def test_numeric_range(self):
+        """
+        range criteria on plain numbers
+        """
+        files = [{"size": v, "path": str(v)} for v in (50, 100, 150, 2500)]
+        criteria = {"size": {"type": "range", "data_type": "int", "value": [100, 2000]}}
+        result = FileFilter(criteria).filter_files(files)
+        self.assertEqual([f["size"] for f in result], [100, 150])
+
+    def test_overlapping_ranges(self):
+        """
+        overlapping and unsorted pairs behave like the per-file check
+        """
+        files = [{"size": v, "path": str(v)} for v in (0, 5, 10, 12, 20, 30.5, 41)]
+        criteria = {
+            "size": {"type": "range", "value": [20, 40, 5, 10, 8, 12, 50, 45]}
+        }
+        file_filter = FileFilter(criteria)
+        expected = [f["size"] for f in files if file_filter._is_valid_file(f)]
+        result = [f["size"] for f in file_filter.filter_files(files)]
+        self.assertEqual(result, expected)
+        self.assertEqual(result, [5, 10, 12, 20, 30.5])
+
+    def test_open_ended_datetime_range(self):
+        """
+        bounds outside the datetime64[ns] span (1677-2262) must not wrap around
+        """
+        criteria = {"time": {"type": "range", "data_type": "datetime",
+                             "value": [datetime(2020, 1, 1), datetime(9999, 1, 1)]}}
+        file_filter = FileFilter(criteria)
+        expected = [f["path"] for f in self.files if file_filter._is_valid_file(f)]
+        result = [f["path"] for f in file_filter.filter_files(self.files)]
+        self.assertEqual(result, expected)
+        self.assertEqual(result, ["a", "b", "c"])
+
+    def test_calibration_with_missing_time(self):
+        """
+        above the calibration threshold, files with time=None still just fail
+        """
+        files = [
+            {"station": "ABC" if i % 5 else "XYZ",
+             "time": None if i % 10 == 0 else datetime(2023, 1, 1, i % 24),
+             "path": str(i)}
+            for i in range(20000)
+        ]
+        criteria = {
+            "station": {"type": "list", "value": ["ABC"]},
+            "time": {"type": "range", "value": [datetime(2023, 1, 1), datetime(2023, 1, 1, 11)]},
+        }
+        result = FileFilter(criteria).filter_files(files)
+        expected = [f["path"] for f in files
+                    if f["station"] == "ABC" and f["time"] is not None and f["time"].hour <= 11]
+        self.assertEqual([f["path"] for f in result], expected)
+
+    def test_invalid_criteria_raises(self):
+        """
+        a criterion without 'type' or 'value' raises instead of exiting
+        """
+        with self.assertRaisesRegex(ValueError, "must contain 'type' and 'value'"):
+            FileFilter({"station": {"value": ["ABC"]}})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from SeisHandler.file_matcher import FileMatcher
+from SeisHandler.pattern_utils import FieldRegistry, DEFAULT_BASE_FIELDS, check_pattern
+
+
+class TestFileMatcher(unittest.TestCase):
+
+    def setUp(self):
+        """
+        run at the beginning of each test method.
+        """
+        registry = FieldRegistry(DEFAULT_BASE_FIELDS)
+        self.regex = check_pattern(
+            "/data", "{home}/{YYYY}/{station}.{component}.{JJJ}.sac", registry
+        )
+        self.paths = [
+            f"/data/2023/ST{i % 50:02d}.BHZ.{i % 365 + 1:03d}.sac" for i in range(4000)
+        ] + ["/data/2023/README.txt"] * 100
+
+    def test_concurrent_matchers(self):
+        """
+        matchers of the same pattern share the pre-filter database, scanning
+        from several threads at once must not lose any file
+        """
+        matchers = [FileMatcher("/data", self.regex) for _ in range(8)]
+
+        def count(matcher):
+            return sum(1 for path in self.paths if matcher._match_file(path))
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            counts = list(executor.map(count, matchers))
+        self.assertEqual(counts, [4000] * 8)
+
+    def test_one_matcher_many_threads(self):
+        """
+        a single matcher used by several threads matches every file once
+        """
+        matcher = FileMatcher("/data", self.regex)
+        chunks = [self.paths[i::8] for i in range(8)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = executor.map(lambda chunk: list(map(matcher._match_file, chunk)), chunks)
+            matched = [fields["path"] for chunk in results for fields in chunk if fields]
+        self.assertEqual(sorted(matched), sorted(self.paths[:4000]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,7 +2,6 @@ import unittest
 import re
 import os
 import tempfile
-from collections import OrderedDict
 from SeisHandler.pattern_utils import FieldRegistry, DEFAULT_BASE_FIELDS, check_pattern
 
 
@@ -30,7 +29,7 @@ class TestPatternUtils(unittest.TestCase):
         if FieldRegistry is initialized with DEFAULT_BASE_FIELDS
         """
         fields = self.registry.get_fields()
-        self.assertIsInstance(fields, OrderedDict)
+        self.assertIsInstance(fields, dict)
         self.assertIn("YYYY", fields)
         self.assertIn("station", fields)
         self.assertIn("component", fields)
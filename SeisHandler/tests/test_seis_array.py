@@ -278,5 +278,99 @@ class TestSeisArray(unittest.TestCase):
         sa.filter(criteria=criteria, threads=4)
         self.assertEqual(len(sa.filtered_files), 3)
 
+    # ----------------------------------------------------------------------
+    # 6) 流式 匹配 + 过滤
+    # ----------------------------------------------------------------------
+    def test_match_and_filter(self):
+        """
+        match_and_filter 的结果应与 match() + filter() 一致
+        """
+        test_2023_dir = os.path.join(self.test_dir, "2023")
+        os.makedirs(test_2023_dir, exist_ok=True)
+        for i in range(5):
+            fpath = os.path.join(test_2023_dir, f"STA{i:02d}_BHZ.sac")
+            with open(fpath, "w") as f:
+                f.write("data")
+
+        pattern = "{home}/{YYYY}/{station}_{component}.sac"
+        criteria = {
+            "station": {
+                "type": "list",
+                "data_type": "str",
+                "value": ["STA01", "STA03"]
+            }
+        }
+        sa = SeisArray(array_dir=self.test_dir, pattern=pattern)
+        sa.match_and_filter(criteria=criteria)
+        self.assertIsNone(sa.files, "流式处理不保存全部匹配结果")
+        self.assertEqual(sorted(sa.get_stations()), ["STA01", "STA03"])
+
+        sa.match()
+        sa.filter(criteria=criteria)
+        self.assertEqual(sorted(sa.get_stations()), ["STA01", "STA03"])
+
+    # ----------------------------------------------------------------------
+    # 7) 按目录层级剪枝
+    # ----------------------------------------------------------------------
+    def test_walk_skips_unmatched_dirs(self):
+        """
+        不匹配 pattern 的目录不进入，层级不够的文件不返回，匹配结果不变
+        """
+        for sub in ["2023", "2024", "logs", os.path.join("2023", "extra")]:
+            os.makedirs(os.path.join(self.test_dir, sub), exist_ok=True)
+        for rel in ["2023/ABC_BHZ.sac", "2024/DEF_BHZ.sac", "logs/GHI_BHZ.sac",
+                    "2023/extra/JKL_BHZ.sac", "top_BHZ.sac"]:
+            with open(os.path.join(self.test_dir, rel), "w") as f:
+                f.write("data")
+
+        pattern = "{home}/{YYYY}/{station}_{component}.sac"
+        sa = SeisArray(array_dir=self.test_dir, pattern=pattern)
+        walked = sorted(os.path.relpath(p, self.test_dir)
+                        for p in sa._make_matcher().get_files())
+        self.assertEqual(walked, ["2023/ABC_BHZ.sac", "2024/DEF_BHZ.sac"])
+
+        sa.match()
+        self.assertEqual(sorted(f["station"] for f in sa.files), ["ABC", "DEF"])
+
+        # {*} 可以跨越目录，之后的层级不剪枝
+        sa = SeisArray(array_dir=self.test_dir, pattern="{home}/{*}/{station}_{component}_{YYYY}.sac")
+        self.assertEqual(sa.dir_patterns, ())
+        self.assertEqual(sa.min_depth, 2)
+
+    # ----------------------------------------------------------------------
+    # 8) 增量匹配清单
+    # ----------------------------------------------------------------------
+    def test_match_with_manifest(self):
+        """
+        未变化的目录直接取清单里的结果，新增文件的目录重新扫描
+        """
+        for year in ["2023", "2024"]:
+            os.makedirs(os.path.join(self.test_dir, year), exist_ok=True)
+            with open(os.path.join(self.test_dir, year, "ABC_BHZ.sac"), "w") as f:
+                f.write("data")
+        # 清单放在阵列目录之外，否则写清单会改变根目录的 mtime
+        manifest_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(manifest_dir.cleanup)
+        manifest = os.path.join(manifest_dir.name, "manifest.pkl")
+        pattern = "{home}/{YYYY}/{station}_{component}.sac"
+
+        sa = SeisArray(array_dir=self.test_dir, pattern=pattern)
+        sa.match(manifest=manifest)
+        first = sorted(f["path"] for f in sa.files)
+        self.assertEqual(len(first), 2)
+
+        # 什么都没变：一个目录都不列
+        with patch("SeisHandler.file_matcher.os.scandir") as scandir:
+            sa.match(manifest=manifest)
+            scandir.assert_not_called()
+        self.assertEqual(sorted(f["path"] for f in sa.files), first)
+
+        new_file = os.path.join(self.test_dir, "2024", "DEF_BHZ.sac")
+        with open(new_file, "w") as f:
+            f.write("data")
+        os.utime(os.path.join(self.test_dir, "2024"), ns=(0, 0))
+        sa.match(manifest=manifest)
+        self.assertEqual(sorted(f["path"] for f in sa.files), sorted(first + [new_file]))
+
 if __name__ == '__main__':
     unittest.main()
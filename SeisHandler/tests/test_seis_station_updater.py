@@ -0,0 +1,140 @@
+import unittest
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from obspy.io.sac import SACTrace
+
+import seis_station_updater as updater
+
+
+class TestSeisStationUpdater(unittest.TestCase):
+
+    def setUp(self):
+        """每个测试前创建临时目录，结束后清理。"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.test_dir = self.tmpdir.name
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write_sac(self, name: str, byteorder: str = "little", **headers) -> str:
+        path = os.path.join(self.test_dir, name)
+        SACTrace(data=np.zeros(10, dtype=np.float32), **headers).write(
+            path, byteorder=byteorder)
+        return path
+
+    # ----------------------------------------------------------------------
+    # 1) lcalda = 1 时，原地改头也要重算 dist/az/baz/gcarc
+    # ----------------------------------------------------------------------
+    def test_update_recomputes_distances(self):
+        """
+        原地写入 stla/stlo 后，派生的距离字段与 SACTrace 整体改写的结果一致
+        """
+        for byteorder in ("little", "big"):
+            path = self._write_sac(f"lcalda_{byteorder}.sac", byteorder,
+                                   evla=10.0, evlo=20.0, stla=30.0, stlo=40.0,
+                                   lcalda=True)
+            reference = shutil.copy(path, path + ".ref")
+            old_gcarc = SACTrace.read(path, headonly=True).gcarc
+
+            values = updater._station_header(34.5, -117.1, 800.0, True)
+            task = (path, updater._pack_position(values), values)
+            self.assertIsNone(updater._update_one(task))
+
+            sac = SACTrace.read(reference)
+            sac.stla, sac.stlo, sac.stel = 34.5, -117.1, 800.0
+            sac.write(reference, byteorder=byteorder)
+
+            result = SACTrace.read(path, headonly=True)
+            expected = SACTrace.read(reference, headonly=True)
+            self.assertNotAlmostEqual(result.gcarc, old_gcarc, places=2)
+            for name in ("gcarc", "dist", "az", "baz"):
+                self.assertAlmostEqual(getattr(result, name), getattr(expected, name),
+                                       places=4, msg=f"{name} ({byteorder})")
+            self.assertAlmostEqual(result.stla, 34.5, places=4)
+
+    def test_update_without_lcalda_keeps_distances(self):
+        """
+        lcalda 关闭时只改台站坐标，距离字段保持不变
+        """
+        path = self._write_sac("no_lcalda.sac", evla=10.0, evlo=20.0,
+                               stla=30.0, stlo=40.0, gcarc=1.5, lcalda=False)
+        values = updater._station_header(34.5, -117.1, None, False)
+        self.assertIsNone(updater._update_one((path, updater._pack_position(values), values)))
+        result = SACTrace.read(path, headonly=True)
+        self.assertAlmostEqual(result.gcarc, 1.5, places=5)
+        self.assertAlmostEqual(result.stlo, -117.1, places=4)
+
+    # ----------------------------------------------------------------------
+    # 2) 校验：lcalda = 1 时距离字段过期也算不一致
+    # ----------------------------------------------------------------------
+    def test_check_header_reports_stale_distances(self):
+        """
+        坐标对、距离还是旧值的文件不能报 OK；按台站表重写后通过
+        """
+        path = self._write_sac("stale.sac", evla=10.0, evlo=20.0,
+                               stla=30.0, stlo=40.0, lcalda=True)
+        with open(path, "r+b") as fh:             # 只改坐标，模拟旧的原地写入
+            fh.seek(updater._SAC_STLA_OFFSET)
+            fh.write(np.array([34.5, -117.1], dtype="<f4").tobytes())
+        meta = (34.5, -117.1, None)
+        issue = updater._check_header(path, meta)
+        self.assertIsNotNone(issue)
+        self.assertIn("gcarc", issue)
+
+        values = updater._station_header(*meta, False)
+        updater._update_one((path, updater._pack_position(values), values))
+        self.assertIsNone(updater._check_header(path, meta))
+
+    def test_check_header_without_event(self):
+        """
+        没有事件位置时只比较台站坐标
+        """
+        path = self._write_sac("no_event.sac", stla=34.5, stlo=-117.1, lcalda=True)
+        self.assertIsNone(updater._check_header(path, (34.5, -117.1, None)))
+        self.assertIn("lat", updater._check_header(path, (35.0, -117.1, None)))
+
+    # ----------------------------------------------------------------------
+    # 3) 重复运行：逐个文件核对头段，只挑出不一致的文件
+    # ----------------------------------------------------------------------
+    def test_find_stale_files_checks_every_file(self):
+        """
+        不一致的文件在列表中间也要被挑出来，其余文件和已正确的台站跳过
+        """
+        good = dict(stla=34.5, stlo=-117.1)
+        files = [self._write_sac(f"A_{i}.sac", **good) for i in range(5)]
+        files[2] = self._write_sac("A_new.sac", stla=0.0, stlo=0.0)
+        other = [self._write_sac("B_0.sac", stla=1.0, stlo=2.0)]
+        table = {"A": (34.5, -117.1, None), "B": (1.0, 2.0, None)}
+
+        stale = updater.find_stale_files({"A": files, "B": other}, table)
+        self.assertEqual(stale, {"A": [files[2]]})
+
+    # ----------------------------------------------------------------------
+    # 4) 台站表：个别坏行不影响分隔符识别
+    # ----------------------------------------------------------------------
+    def test_read_station_table_with_bad_line(self):
+        """
+        一行缺少逗号时仍按逗号解析，只对这一行告警
+        """
+        path = os.path.join(self.test_dir, "stations.txt")
+        with open(path, "w") as f:
+            f.write("TST1,34.5,-117.1,800\nBADLINE\nTST2,35.2,-118,500\n")
+        old_file = updater.STATION_FILE
+        updater.STATION_FILE = Path(path)
+        try:
+            with self.assertLogs(level="WARNING") as logs:
+                table = updater.read_station_table()
+        finally:
+            updater.STATION_FILE = old_file
+        self.assertEqual(table, {"TST1": (34.5, -117.1, 800.0),
+                                 "TST2": (35.2, -118.0, 500.0)})
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("BADLINE", logs.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
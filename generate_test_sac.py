@@ -14,6 +14,7 @@ Changes in this revision
 from __future__ import annotations
 
 import random
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import List, Tuple
 
@@ -36,16 +37,16 @@ STATIONS: List[Tuple[str, float, float, float]] = [
 ]
 STATION_FILE: Path = Path("./example/test_stations.txt")
 SEED: int = 42
+NPTS: int = 1000  # samples per file (10 s at 100 Hz)
+WORKERS: int = 1  # >1 → write the files from a process pool
 
 # ---------------------------------------------------------------------------
 # Helper
 # ---------------------------------------------------------------------------
 
-def _make_sac(path: Path, starttime: UTCDateTime) -> None:
-    """Write a 10‑second dummy SAC file with empty coordinate headers."""
-    npts = 1000
+def _make_sac(path: Path, starttime: UTCDateTime, data: np.ndarray) -> None:
+    """Write `data` as a dummy SAC file (100 Hz) with empty coordinate headers."""
     dt = 0.01
-    data = np.random.randn(npts).astype(np.float32)
     trace = Trace(data=data)
     trace.stats.delta = dt
     trace.stats.starttime = starttime
@@ -71,16 +72,25 @@ def main() -> None:
     # 1. Generate SAC files
     print("Generating synthetic SAC files …")
     start_date = UTCDateTime(f"{YEAR}-01-01")
-    count = 0
+    paths: List[Path] = []
+    starttimes: List[UTCDateTime] = []
     for sta, _lat, _lon, _elev in STATIONS:
         for jjj in range(DAY_RANGE[0], DAY_RANGE[1] + 1):
-            jday_date = start_date + (jjj - 1) * 86400
-            jjj_str = f"{jjj:03d}"
             dir_path = ROOT / f"{YEAR}" / f"{NETWORK}.{sta}"
-            fname = f"{NETWORK}.{sta}.{COMP}.{jjj_str}.SAC"
-            full_path = dir_path / fname
-            _make_sac(full_path, starttime=jday_date)
-            count += 1
+            paths.append(dir_path / f"{NETWORK}.{sta}.{COMP}.{jjj:03d}.SAC")
+            starttimes.append(start_date + (jjj - 1) * 86400)
+
+    # all samples from one PCG64 call, drawn as float32 straight into the
+    # output buffer (no float64 pass), one row per file
+    data = np.empty((len(paths), NPTS), dtype=np.float32)
+    np.random.default_rng(SEED).standard_normal(out=data, dtype=np.float32)
+    if WORKERS > 1:
+        with ProcessPoolExecutor(max_workers=WORKERS) as ex:
+            list(ex.map(_make_sac, paths, starttimes, data, chunksize=max(1, len(paths) // (4 * WORKERS))))
+    else:
+        for path, starttime, row in zip(paths, starttimes, data):
+            _make_sac(path, starttime, row)
+    count = len(paths)
     print(f"Created {count} SAC files under {ROOT}/")
 
     # 2. Write station list CSV
@@ -10,18 +10,23 @@ sac_resp_processor.py
 from __future__ import annotations
 
 import atexit
+import io
 import logging
 import os
 import signal
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Set, Tuple
 
 import numpy as np
+import pandas as pd
 from obspy import read,read_inventory
 from obspy.io.sac import SACTrace
+from scipy.signal.windows import hann
 from tqdm import tqdm
 from SeisHandler import SeisArray
 from seishandler_resp import RespArray
@@ -42,6 +47,9 @@ CUSTOM_RESP = {
 }
 
 
+# SAC 扫描清单：未变化的目录不再重新扫描 (None = 每次全量扫描)
+SAC_MANIFEST: Path | None = Path("sac_manifest.pkl")
+
 # 输出
 OUT_DIR: Path = Path("/data/userdata/ludan/wjx_data/y3_1Hz")
 
@@ -70,6 +78,12 @@ RESP_FILTER: Dict = {
     "resptype": {"type": "list", "value": ["RESP"]}
 }
 WATER_LEVEL: int = 60
+# 每个任务处理同一 RESP 的 SAC 文件数上限（控制单任务耗时与内存）
+GROUP_SIZE: int = 32
+
+
+# 进度输出最小间隔（秒）；后台模式下写日志，不用 tqdm
+PROGRESS_INTERVAL: float = 5.0
 
 
 ###############################################################################
@@ -107,25 +121,59 @@ def _daemonize() -> None:
     signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
 
 
+class _LogProgress:
+    """后台模式的进度：每 PROGRESS_INTERVAL 秒写一行日志，接口同 tqdm 的 update/close。"""
+
+    def __init__(self, total: int, desc: str):
+        self.total, self.desc, self.n = total, desc, 0
+        self._last = time.monotonic()
+
+    def update(self, n: int = 1) -> None:
+        self.n += n
+        now = time.monotonic()
+        if now - self._last >= PROGRESS_INTERVAL:
+            self._last = now
+            logging.info("%s %d/%d", self.desc, self.n, self.total)
+
+    def close(self) -> None:
+        logging.info("%s %d/%d", self.desc, self.n, self.total)
+
+
+def _progress(total: int, desc: str):
+    """前台用 tqdm（限速刷新），后台 stdout 已重定向到日志，用 _LogProgress。"""
+    if DAEMON_MODE:
+        return _LogProgress(total, desc)
+    # 关掉 tqdm 的监控线程（默认每 10 s 一次）：进度条建在进程池之前，
+    # fork 时不能有别的线程在跑；刷新仍由 update() 按 mininterval 触发
+    tqdm.monitor_interval = 0
+    return tqdm(total=total, desc=desc, unit="file",
+                mininterval=1.0, maxinterval=PROGRESS_INTERVAL)
+
+
 ###############################################################################
 # 工具函数
 ###############################################################################
 KEY_FIELDS = ("network", "station", "component")
 
 
-def _key(rec) -> Tuple[str, str, str]:
-    return tuple(rec[k] for k in KEY_FIELDS)
+def pair_sac_resp(sac_records: List[dict], resp_records: List[dict]) -> pd.DataFrame:
+    """
+    按 KEY_FIELDS 把 SAC 与 RESP 做一次 left join（而不是逐条查 dict）。
+    返回列：network, station, component, path, resp_path；无对应 RESP 时 resp_path 为 None。
+    重复的 RESP 只保留第一个。
+    """
+    keys = list(KEY_FIELDS)
+    sac_df = pd.DataFrame(sac_records, columns=[*keys, "path"])
+    resp_df = pd.DataFrame(resp_records or [], columns=[*keys, "path"])
 
+    dup = resp_df.duplicated(keys)
+    for k in resp_df.loc[dup, keys].itertuples(index=False, name=None):
+        logging.warning("Duplicate resp for %s.%s.%s; keep first", *k)
+    resp_df = resp_df[~dup].rename(columns={"path": "resp_path"})
 
-def build_resp_lookup(resp_records: List[dict]) -> Dict[Tuple[str, str, str], str]:
-    lut: Dict[Tuple[str, str, str], str] = {}
-    for rec in resp_records:
-        k = _key(rec)
-        if k in lut:
-            logging.warning("Duplicate resp for %s.%s.%s; keep first", *k)
-            continue
-        lut[k] = rec["path"]
-    return lut
+    paired = sac_df.merge(resp_df, on=keys, how="left")
+    paired["resp_path"] = paired["resp_path"].astype(object).where(paired["resp_path"].notna(), None)
+    return paired
 
 
 ###############################################################################
@@ -142,48 +190,136 @@ def _make_prefilt(fmin: float | None, fmax: float | None
     return (0.8 * fmin, fmin, fmax, 1.2 * fmax)
 
 
+# FREQ_MIN / FREQ_MAX 为常量，预滤波窗口只算一次
+_PREFILT = _make_prefilt(FREQ_MIN, FREQ_MAX)
+
+
+###############################################################################
+# 仪器响应缓存
+###############################################################################
+@lru_cache(maxsize=256)
+def _load_inv(resp_path: str):
+    """
+    每个 RESP 只解析一次：同一台站分量的所有 SAC 天文件共用。
+    线程池共享这份缓存；remove_response 不会修改 inventory。
+    """
+    return read_inventory(resp_path, format="RESP")
+
+
+###############################################################################
+# 预处理
+###############################################################################
+TAPER_PERCENTAGE: float = 0.05
+
+
+@lru_cache(maxsize=16)
+def _hann_taper(npts: int, max_percentage: float = TAPER_PERCENTAGE) -> np.ndarray:
+    """
+    与 Trace.taper(max_percentage, type="hann") 完全相同的窗（float64），
+    按长度缓存：同采样率的天文件共用一个窗。
+    """
+    wlen = min(int(max_percentage * npts), int(npts / 2))
+    sides = hann(2 * wlen if 2 * wlen == npts else 2 * wlen + 1)
+    taper = np.ones(npts)
+    taper[:wlen] = sides[:wlen]
+    taper[npts - wlen:] = sides[len(sides) - wlen:]
+    taper.flags.writeable = False
+    return taper
+
+
+def _demean_taper(tr) -> None:
+    """原地去均值 + 汉宁 taper，等价于 detrend("demean") + taper(0.05, "hann")。"""
+    data = tr.data
+    if not np.issubdtype(data.dtype, np.floating):
+        data = tr.data = data.astype(np.float64)
+    data -= data.mean()
+    data *= _hann_taper(len(data))
+
+
+###############################################################################
+# 输出
+###############################################################################
+def _existing_outputs(root: Path) -> Set[str]:
+    """root 下已有的文件（相对路径），一次遍历代替每个文件一次 stat。"""
+    found: Set[str] = set()
+    stack = [(str(root), "")]
+    while stack:
+        path, rel = stack.pop()
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    sub = os.path.join(rel, entry.name) if rel else entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, sub))
+                    else:
+                        found.add(sub)
+        except OSError as exc:     # 目录不存在/无权限/不是目录：当作没有已有输出
+            if not isinstance(exc, FileNotFoundError):
+                logging.warning("Can not scan %s: %s", path, exc)
+    return found
+
+
+def _write_bytes(path: Path, data) -> None:
+    """整块写出：不经 Python 缓冲文件对象，通常一次 write 系统调用。"""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
 ###############################################################################
 # 核心处理单元（仅 RESP）
 ###############################################################################
-def process_one(sac: Path, resp: str, rel: Path) -> bool:
+def process_one(sac: str, inv, rel: str) -> bool:
     """
     读取 SAC → 轻量预处理 → 去响应 (RESP) → 写出 SAC。
     返回 True 表示成功。
     """
     out_path = OUT_DIR / rel
-    if SKIP_EXISTING and out_path.exists():
-        return True
-
     out_path.parent.mkdir(parents=True, exist_ok=True)
     try:
         # 1) 读取 SAC
-        tr = read(str(sac))[0]
+        tr = read(sac)[0]
 
         # 1.1) 轻量预处理：去均值 & 5% taper（汉宁窗）
-        tr.detrend("demean")
-        tr.taper(max_percentage=0.05, type="hann")
-
-        # 2) 计算预滤波窗口
-        prefilt = _make_prefilt(FREQ_MIN, FREQ_MAX)
+        _demean_taper(tr)
 
-        # 3) 去仪器响应（RESP 格式）
-        inv = read_inventory(resp, format="RESP")   # <60 ms, 会缓存
+        # 2) 去仪器响应（RESP 格式）
         tr.remove_response(
             inventory=inv,
             output="VEL",     # 如需 DIS/ACC 可改
-            pre_filt=prefilt,
+            pre_filt=_PREFILT,
             water_level=WATER_LEVEL,   # 防止低频奇异
         )
 
-        # 4) 写出
-        SACTrace.from_obspy_trace(tr).write(str(out_path), byteorder="little")
+        # 3) 写出
+        buf = io.BytesIO()
+        SACTrace.from_obspy_trace(tr).write(buf, byteorder="little")
+        _write_bytes(out_path, buf.getbuffer())
         return True
 
     except Exception:
-        logging.exception("rmresp failed %s with %s", sac, resp)
+        logging.exception("rmresp failed %s", sac)
         return False
 
 
+def process_group(resp: str, jobs: List[Tuple[str, str]]) -> int:
+    """
+    同一 RESP 的一批 SAC：inventory 只取一次，再逐个 process_one。
+    单个文件失败不影响同批其他文件。返回成功的文件数。
+    在进程池中运行，参数只用字符串；_load_inv 的缓存按进程各自命中。
+    """
+    try:
+        inv = _load_inv(resp)
+    except Exception:
+        logging.exception("read RESP failed %s (%d SAC skipped)", resp, len(jobs))
+        return 0
+    return sum(process_one(sac, inv, rel) for sac, rel in jobs)
+
+
 ###############################################################################
 # 主流程
 ###############################################################################
@@ -200,72 +336,87 @@ def main() -> None:
         _daemonize()
         logging.info("Daemon started. PID=%s  LOG=%s", os.getpid(), LOG_FILE)
 
-    # 1) 扫描 SAC
+    # 1) 先扫 RESP，再扫 SAC
+    #    RESP 树很小，单进程匹配即可，进程池只留给 SAC；
+    #    两者不并发：进程池 fork 时不能有别的线程在跑（否则可能死锁）
     sac_arr = SeisArray(SAC_ROOT, SAC_PATTERN)
-    sac_arr.match(threads=THREADS)
+    resp_arr = RespArray(RESP_ROOT, RESP_PATTERN,custom_fields=CUSTOM_RESP)
+    resp_arr.match(threads=1)
+    sac_arr.match(threads=THREADS, manifest=SAC_MANIFEST)
+
     sac_records = sac_arr.files
     if not sac_records:
         logging.error("No SAC files matched.")
         sys.exit(1)
     logging.info("SAC matched: %d", len(sac_records))
 
-    # 2) 扫描 RESP
-    resp_arr = RespArray(RESP_ROOT, RESP_PATTERN,custom_fields=CUSTOM_RESP)
-    resp_arr.match(threads=THREADS)
+    # 2) RESP 过滤
     if RESP_FILTER:
         resp_arr.filter(RESP_FILTER)
-    resp_records = resp_arr.files
+        resp_records = resp_arr.filtered_files
+    else:
+        resp_records = resp_arr.files
 
-    # 配对
-    resp_lut = build_resp_lookup(resp_records)
+    # 配对（一次 join）
+    paired = pair_sac_resp(sac_records, resp_records)
+    missing = int(paired["resp_path"].isna().sum())
 
     # 3) TEST 模式
     if TEST_MODE:
-        missing = 0
         print("\n===== TEST MODE: SAC ↔ RESP =====")
-        for rec in sac_records:
-            key        = _key(rec)                 # network, station, component
-            sac_path   = rec["path"]               # ← SAC 全路径
-            resp_path  = resp_lut.get(key)         # 找对应 RESP
-
+        for *key, sac_path, resp_path in paired.itertuples(index=False, name=None):
             # 打印：SAC → RESP  一条一条
             print(f"SAC:  {sac_path}\n"
                 f"RESP: {resp_path or 'MISSING'}\n"
                 f"KEY:  {'.'.join(key)}\n"
                 "─" * 60)
 
-            if resp_path is None:
-                missing += 1
-
         print(f"\nTotal {len(sac_records)}, Missing RESP {missing}\n")
         return
 
 
     # 4) 正式并行处理
-    missing = 0
-    pbar = tqdm(total=len(sac_records), desc="rmRESP", unit="file")
-
-    with ThreadPoolExecutor(max_workers=THREADS) as exe:
-        futs = []
-        for rec in sac_records:
-            k = _key(rec)
-            r = resp_lut.get(k)
-            if not r:
-                missing += 1
-                pbar.update(1)
-                continue
-            rel = Path(rec["path"]).relative_to(SAC_ROOT)
-            futs.append(exe.submit(process_one, Path(rec["path"]), r, rel))
-
-        for fut in as_completed(futs):
-            fut.result()
-            pbar.update(1)
+    # 已存在的输出一次列出，提交前就跳过
+    existing = _existing_outputs(OUT_DIR) if SKIP_EXISTING else set()
+    skipped = 0
+
+    # 按 RESP（即 network.station.component）分组，每组再切成 GROUP_SIZE 一批
+    batch_resps: List[str] = []
+    batch_jobs: List[List[Tuple[str, str]]] = []
+    root = str(SAC_ROOT)
+    for r, group in paired[paired["resp_path"].notna()].groupby("resp_path", sort=False):
+        jobs = []
+        for p in group["path"].tolist():
+            rel = os.path.relpath(p, root)
+            if rel in existing:
+                skipped += 1
+            else:
+                jobs.append((p, rel))
+        for i in range(0, len(jobs), GROUP_SIZE):
+            batch_resps.append(r)
+            batch_jobs.append(jobs[i:i + GROUP_SIZE])
+    if skipped:
+        logging.info("Skip %d existing outputs", skipped)
+
+    pbar = _progress(len(sac_records), "rmRESP")
+    pbar.update(missing + skipped)
+
+    # detrend / taper 等 Python 层操作持有 GIL，改用进程池
+    failed = 0
+    workers = min(THREADS, os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as exe:
+        chunksize = max(1, len(batch_jobs) // (4 * workers))
+        results = exe.map(process_group, batch_resps, batch_jobs, chunksize=chunksize)
+        for jobs, ok in zip(batch_jobs, results):
+            failed += len(jobs) - ok
+            pbar.update(len(jobs))
 
     pbar.close()
     logging.info(
-        "DONE. SAC=%d | RESP missing=%d | Output=%s",
+        "DONE. SAC=%d | RESP missing=%d | failed=%d | Output=%s",
         len(sac_records),
         missing,
+        failed,
         OUT_DIR,
     )
 
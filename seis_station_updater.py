@@ -11,16 +11,18 @@ seis_station_updater.py (auto-delimiter, tqdm, console-only)
 """
 from __future__ import annotations
 
-import csv
 import logging
+import os
+import random
+import struct
 import sys
-from collections import Counter
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
+import numpy as np
+from obspy.geodetics import gps2dist_azimuth, kilometer2degrees
 from obspy.io.sac import SACTrace
 from tqdm.auto import tqdm
 from SeisHandler import SeisArray
@@ -38,6 +40,7 @@ from SeisHandler import SeisArray
 # ELEV_COL: Optional[int] = 3                 # None → 不写海拔
 
 # THREADS: int = 12
+# IO_THREADS: int = 64
 # MAP_FILE: Path = Path("station_map.png")
 # LOG_LEVEL: str = "INFO"
 
@@ -53,7 +56,11 @@ LAT_COL: int = 1
 LON_COL: int = 2
 ELEV_COL: Optional[int] = 3         # 不写海拔就改为 None
 
-THREADS: int = 4                    # 小数据集用 4 线程足够
+THREADS: int = 4                    # 小数据集用 4 线程足够（文件扫描的进程数）
+IO_THREADS: int = 32                # 改头/校验的 I/O 线程数：多路并发请求才能填满 SSD 队列
+MAP_LABEL_LIMIT: int = 200         # 台站多于此数时只给每个网格里的一个台站标名
+VERIFY_RATIO: float = 0.1           # 写入成功的台站中抽查的比例，1.0 → 全部校验
+SKIP_TAGGED: bool = False           # True → 先逐个读头段，只重写不一致的文件（重复运行时）
 MAP_FILE: Path = Path("./example/station_map.png")
 LOG_LEVEL: str = "DEBUG"            # 便于观察详细日志
 
@@ -61,42 +68,119 @@ LOG_LEVEL: str = "DEBUG"            # 便于观察详细日志
 ###############################################################################
 # Helper functions
 ###############################################################################
-def _detect_delimiter(sample_line: str) -> Optional[str]:
-    """Return ',', '\\t' or None (whitespace) based on first non-comment line."""
-    if "," in sample_line:
-        return ","
-    if "\t" in sample_line:
-        return "\t"
-    # 默认：任意空白
+# SAC 头段：70 个 float32 + 40 个 int32 + 192 字节字符串
+_SAC_HEADER_SIZE = 632
+_SAC_UNDEF = -12345.0
+_SAC_FLOAT_INDEX = {"stla": 31, "stlo": 32, "stel": 33}
+_SAC_NVHDR_OFFSET = 280 + 6 * 4     # int 头段第 7 个字 = 版本号 6
+_SAC_STLA_OFFSET = _SAC_FLOAT_INDEX["stla"] * 4   # stla, stlo, stel 连续存放
+_SAC_EVLA_OFFSET = 35 * 4           # evla, evlo 连续存放
+_SAC_DIST_INDEX = {"dist": 50, "az": 51, "baz": 52, "gcarc": 53}
+_SAC_DIST_OFFSET = _SAC_DIST_INDEX["dist"] * 4    # dist, az, baz, gcarc 连续存放
+_SAC_LCALDA_OFFSET = 280 + 38 * 4   # int 头段第 39 个字 = lcalda
+_SAC_INT_UNDEF = -12345
+
+
+def _sac_byteorder(head: bytes) -> Optional[str]:
+    """'<' / '>' for a SAC v6 header, None if the version is not recognised."""
+    if len(head) < _SAC_HEADER_SIZE:
+        return None
+    for order in "<>":
+        if struct.unpack_from(f"{order}i", head, _SAC_NVHDR_OFFSET)[0] == 6:
+            return order
     return None
 
 
+def _sac_distances(head: bytes, order: str, stla: float,
+                   stlo: float) -> Optional[Tuple[float, float, float, float]]:
+    """
+    (dist, az, baz, gcarc) for a station at (stla, stlo), as SACTrace derives
+    them when lcalda is set; None if lcalda is off or the event is undefined.
+    """
+    lcalda = struct.unpack_from(f"{order}i", head, _SAC_LCALDA_OFFSET)[0]
+    if lcalda in (0, _SAC_INT_UNDEF):
+        return None
+    evla, evlo = struct.unpack_from(f"{order}ff", head, _SAC_EVLA_OFFSET)
+    if _SAC_UNDEF in (evla, evlo):
+        return None
+    # 和 SACTrace 一样用头段里 float32 精度的坐标计算
+    stla, stlo = float(np.float32(stla)), float(np.float32(stlo))
+    try:
+        m, az, baz = gps2dist_azimuth(evla, evlo, stla, stlo)
+    except ValueError:
+        return None
+    dist = m / 1000.0
+    return dist, az, baz, kilometer2degrees(dist)
+
+
+def _read_head(path) -> Tuple[bytes, str]:
+    """632-byte header of a SAC v6 file and its byte order; ValueError otherwise."""
+    with open(path, "rb") as fh:
+        head = fh.read(_SAC_HEADER_SIZE)
+    if len(head) < _SAC_HEADER_SIZE:
+        raise ValueError(f"truncated SAC header ({len(head)} bytes)")
+    order = _sac_byteorder(head)
+    if order is None:
+        raise ValueError("not a SAC v6 header")
+    return head, order
+
+
+def _header_floats(head: bytes, order: str, index: Dict[str, int]) -> Dict[str, Optional[float]]:
+    """Float header words by name, undefined (-12345) → None."""
+    floats = np.frombuffer(head, dtype=f"{order}f4", count=70)
+    return {name: None if floats[i] == _SAC_UNDEF else float(floats[i])
+            for name, i in index.items()}
+
+
+def read_sac_header(path) -> Dict[str, Optional[float]]:
+    """
+    只读取 632 字节头段（不读、不解码数据段），返回 stla/stlo/stel，
+    未定义值 (-12345) → None。字节序由 nvhdr == 6 判断。
+    """
+    return _header_floats(*_read_head(path), _SAC_FLOAT_INDEX)
+
+
+_SNIFF_LINES = 64
+_DELIMITERS = (",", "\t", ";", "|")
+
+
+def _detect_delimiter(lines: List[str]) -> Optional[str]:
+    """
+    Pick the delimiter from the first data lines of the station file: the
+    candidate found on the most lines wins, then the one with the most
+    consistent count on those lines (lowest variance), then the earlier one
+    in `_DELIMITERS`. A candidate missing from more than half of the lines is
+    ignored, so one bad line does not change the delimiter of the whole file.
+    None → any whitespace.
+    """
+    sample = lines[:_SNIFF_LINES]
+    if not sample:
+        return None
+    best, best_key = None, None
+    for delim in _DELIMITERS:
+        counts = np.array([ln.count(delim) for ln in sample])
+        present = counts > 0
+        hits = int(present.sum())
+        if 2 * hits < len(sample):
+            continue
+        key = (-hits, counts[present].var())
+        if best_key is None or key < best_key:
+            best, best_key = delim, key
+    return best
+
+
 def read_station_table() -> Dict[str, Tuple[float, float, Optional[float]]]:
     """Parse station list → {station: (lat, lon, elev)}  (auto delimiter)."""
+    # 台站表很小：一次读完，去掉注释和空行后逐行 split，不需要 csv 的引号状态机
+    lines = [ln.split("#", 1)[0] for ln in STATION_FILE.read_text().splitlines()]
+    lines = [ln for ln in lines if ln.strip()]
+    if not lines:
+        logging.error("Station file is empty or only comments")
+        return {}
+    delimiter = _detect_delimiter(lines)
     mapping: Dict[str, Tuple[float, float, Optional[float]]] = {}
-    with STATION_FILE.open() as fh:
-        # 先读取第一行有效内容判断分隔符
-        for line in fh:
-            if line.strip() and not line.lstrip().startswith("#"):
-                delimiter = _detect_delimiter(line)
-                fh.seek(0)                 # 回到文件开头
-                break
-        else:
-            logging.error("Station file is empty or only comments")
-            return mapping
-
-        if delimiter:                      # CSV 模式
-            reader = csv.reader(fh, delimiter=delimiter)
-            for parts in reader:
-                if not parts or parts[0].startswith("#"):
-                    continue
-                _process_row(parts, mapping)
-        else:                              # 任意空白
-            for raw in fh:
-                parts = raw.strip().split()
-                if not parts or parts[0].startswith("#"):
-                    continue
-                _process_row(parts, mapping)
+    for parts in [ln.split(delimiter) if delimiter else ln.split() for ln in lines]:
+        _process_row(parts, mapping)
     return mapping
 
 
@@ -104,7 +188,7 @@ def _process_row(parts: List[str],
                  mapping: Dict[str, Tuple[float, float, Optional[float]]]) -> None:
     """Parse a single row and update mapping."""
     try:
-        sta  = parts[STATION_COL]
+        sta  = parts[STATION_COL].strip()
         lat  = float(parts[LAT_COL])
         lon  = float(parts[LON_COL])
         elev = float(parts[ELEV_COL]) if ELEV_COL is not None else None
@@ -113,43 +197,142 @@ def _process_row(parts: List[str],
         logging.warning("Bad station line: %s (%s)", parts, exc)
 
 
+def _station_header(lat: float, lon: float, elev: Optional[float],
+                     write_elev: bool) -> Dict[str, float]:
+    """Header values to write for one station: stla/stlo, plus stel if wanted."""
+    if write_elev and elev is not None:
+        return {"stla": lat, "stlo": lon, "stel": elev}
+    return {"stla": lat, "stlo": lon}
+
+
+def _pack_position(values: Dict[str, float]) -> Dict[str, bytes]:
+    """stla/stlo(/stel) packed once per station, for both byte orders."""
+    fmt = "f" * len(values)
+    return {order: struct.pack(order + fmt, *values.values()) for order in "<>"}
+
+
+def _update_one(task: Tuple[str, Dict[str, bytes], Dict[str, float]]) -> Optional[str]:
+    """Write stla/stlo(/stel) into one SAC file; return the error, None on success."""
+    p, packed, values = task
+    try:
+        # 只改头段里的 3 个 float：原地覆盖预先打包好的字节，数据段不读不写
+        fd = os.open(p, os.O_RDWR | getattr(os, "O_BINARY", 0))
+        try:
+            head = os.read(fd, _SAC_HEADER_SIZE)
+            order = _sac_byteorder(head)
+            if order is not None:
+                os.lseek(fd, _SAC_STLA_OFFSET, os.SEEK_SET)
+                os.write(fd, packed[order])
+                # lcalda = 1 时 dist/az/baz/gcarc 跟着台站坐标重算（同 SACTrace）
+                dists = _sac_distances(head, order, values["stla"], values["stlo"])
+                if dists is not None:
+                    os.lseek(fd, _SAC_DIST_OFFSET, os.SEEK_SET)
+                    os.write(fd, struct.pack(f"{order}ffff", *dists))
+                return None
+        finally:
+            os.close(fd)
+        # 其他头段版本交给 ObsPy 整体读写
+        sac = SACTrace.read(p)
+        for name, value in values.items():
+            setattr(sac, name, value)
+        # 直接覆盖写入
+        sac.write(p, byteorder="little")
+        return None
+    except Exception as exc:       # noqa: BLE001
+        return str(exc)            # 由调用方统一记录，避免线程里逐条争用日志锁
+
+
+def _progress(total: int, desc: str, unit: str, iterable=None) -> tqdm:
+    """tqdm that redraws at most ~1000 times, however many items there are."""
+    return tqdm(iterable, total=total, desc=desc, unit=unit,
+                miniters=max(1, total // 1000), mininterval=0.5, smoothing=0)
+
+
 def update_sac_headers(
-    station_files: Dict[str, List[Path]],
+    station_files: Dict[str, List[str]],
     station_meta: Dict[str, Tuple[float, float, Optional[float]]],
-) -> None:
+) -> Dict[str, bool]:
+    """Write headers; return {station: all files written} for stations in the table."""
     total = sum(len(v) for v in station_files.values())
-    pbar  = tqdm(total=total, desc="Writing SAC headers", unit="file")
+    pbar  = _progress(total, "Writing SAC headers", "file")
     write_elev = ELEV_COL is not None
 
+    tasks = []
+    task_stations: List[str] = []
+    unlisted: List[str] = []
     for sta, files in station_files.items():
         meta = station_meta.get(sta)
         if meta is None:
-            logging.warning("Station %s not in list; skip", sta)
+            unlisted.append(sta)
             pbar.update(len(files))
             continue
-
-        lat, lon, elev = meta
-        for p in files:
-            try:
-                sac = SACTrace.read(str(p))
-                sac.stla, sac.stlo = lat, lon
-                if write_elev and elev is not None:
-                    sac.stel = elev
-                # 直接覆盖写入
-                sac.write(str(p), byteorder="little")
-            except Exception as exc:       # noqa: BLE001
-                logging.error("Failed to update %s: %s", p, exc)
-            finally:
-                pbar.update(1)
+        # 是否写海拔按台站决定一次，逐文件的任务里不再有分支
+        values = _station_header(*meta, write_elev)
+        packed = _pack_position(values)
+        tasks.extend((p, packed, values) for p in files)
+        task_stations.extend([sta] * len(files))
+
+    # 文件读写为主，线程间可重叠 I/O
+    write_ok: Dict[str, bool] = {}
+    errors: List[Tuple[str, str]] = []
+    with ThreadPoolExecutor(max_workers=IO_THREADS) as ex:
+        for sta, task, err in zip(task_stations, tasks, ex.map(_update_one, tasks)):
+            if err is not None:
+                errors.append((task[0], err))
+            write_ok[sta] = write_ok.get(sta, True) and err is None
+            pbar.update(1)
     pbar.close()
 
+    if unlisted:
+        logging.warning("%d station(s) not in list; skip: %s",
+                        len(unlisted), ", ".join(unlisted))
+    if errors:
+        logging.error("Failed to update %d file(s):\n%s", len(errors),
+                      "\n".join(f"  {p}: {err}" for p, err in errors))
+    return write_ok
+
+
+def _label_sample(lons: np.ndarray, lats: np.ndarray, limit: int) -> np.ndarray:
+    """
+    Indices of at most `limit` stations to label: split the map into a grid
+    and keep, per occupied cell, the station closest to the cell centre.
+    """
+    nbin = max(1, int(np.sqrt(limit)))
+    cells, dist = [], 0.0
+    for values in (lons, lats):
+        edges = np.linspace(values.min(), values.max(), nbin + 1)
+        idx = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, nbin - 1)
+        centres = (edges[:-1] + edges[1:]) / 2
+        dist = dist + (values - centres[idx]) ** 2
+        cells.append(idx)
+    cell = cells[0] * nbin + cells[1]
+    order = np.lexsort((dist, cell))
+    first = np.r_[True, cell[order][1:] != cell[order][:-1]]
+    return order[first]
+
 
 def make_station_map(station_meta: Dict[str, Tuple[float, float, Optional[float]]]) -> None:
-    lons, lats = zip(*[(v[1], v[0]) for v in station_meta.values()])
+    if not station_meta:
+        logging.warning("No station metadata; skip station map")
+        return
+    # 只有画图时才导入 matplotlib（启动快几百毫秒）；无界面后端
+    import matplotlib
+    if matplotlib.get_backend().lower() != "agg":
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    names = list(station_meta)
+    lats = np.fromiter((v[0] for v in station_meta.values()), dtype=float, count=len(names))
+    lons = np.fromiter((v[1] for v in station_meta.values()), dtype=float, count=len(names))
     fig, ax = plt.subplots(figsize=(8, 5))
-    ax.scatter(lons, lats, marker="^", s=25)
-    for sta, (lat, lon, _e) in station_meta.items():
-        ax.text(lon, lat, sta, fontsize=7)
+    ax.scatter(lons, lats, marker="^", s=25, rasterized=True)
+    # 每个标签一个 Text 对象；台站太多时只标一个抽样（名字也已无法辨认）
+    if len(names) <= MAP_LABEL_LIMIT:
+        labelled = range(len(names))
+    else:
+        labelled = _label_sample(lons, lats, MAP_LABEL_LIMIT)
+    for i in labelled:
+        ax.text(lons[i], lats[i], names[i], fontsize=7)
     ax.set_xlabel("Longitude")
     ax.set_ylabel("Latitude")
     ax.set_title("Station distribution")
@@ -159,32 +342,94 @@ def make_station_map(station_meta: Dict[str, Tuple[float, float, Optional[float]
     logging.info("Station map saved → %s", MAP_FILE)
 
 
+def _check_header(path: str, meta: Tuple[float, float, Optional[float]]) -> Optional[str]:
+    """Compare one SAC header with (lat, lon, elev); return the issues, None if OK."""
+    lat_ref, lon_ref, elev_ref = meta
+    try:
+        head, order = _read_head(path)   # 只读头段
+    except Exception as exc:           # noqa: BLE001
+        return f"read_error: {exc}"
+    hdr = _header_floats(head, order, _SAC_FLOAT_INDEX)
+    stla, stlo, stel = hdr["stla"], hdr["stlo"], hdr["stel"]
+    issues = []
+    if stla is None or abs(stla - lat_ref) > 1e-4:
+        issues.append(f"lat {stla} ≠ {lat_ref}")
+    if stlo is None or abs(stlo - lon_ref) > 1e-4:
+        issues.append(f"lon {stlo} ≠ {lon_ref}")
+    if (ELEV_COL is not None and elev_ref is not None
+            and (stel is None or abs(stel - elev_ref) > 0.1)):
+        issues.append(f"elev {stel} ≠ {elev_ref}")
+    # lcalda = 1 时距离/方位角应与台站表坐标一致（旧文件可能还留着旧值）
+    expected = _sac_distances(head, order, lat_ref, lon_ref)
+    if expected is not None:
+        derived = _header_floats(head, order, _SAC_DIST_INDEX)
+        for (name, value), ref in zip(derived.items(), expected):
+            if name in ("az", "baz"):
+                off = None if value is None else abs((value - ref + 180.0) % 360.0 - 180.0)
+                tol = 1e-2
+            else:
+                off = None if value is None else abs(value - ref)
+                tol = 1e-3 * max(1.0, abs(ref))   # float32 相对精度
+            if off is None or off > tol:
+                issues.append(f"{name} {value} ≠ {ref:.4f}")
+    return "; ".join(issues) or None
+
+
+def find_stale_files(
+    station_files: Dict[str, List[str]],
+    station_meta: Dict[str, Tuple[float, float, Optional[float]]],
+) -> Dict[str, List[str]]:
+    """
+    Files whose header does not carry the table's values yet, by station;
+    every header is read (one 632-byte read each), stations already correct
+    are left out.
+    """
+    tasks = [(sta, p) for sta, files in station_files.items() if sta in station_meta
+             for p in files]
+    stale: Dict[str, List[str]] = defaultdict(list)
+    with ThreadPoolExecutor(max_workers=IO_THREADS) as ex:
+        issues = ex.map(lambda task: _check_header(task[1], station_meta[task[0]]), tasks)
+        for issue, (sta, p) in zip(_progress(len(tasks), "Checking SAC headers",
+                                             "file", issues), tasks):
+            if issue is not None:
+                stale[sta].append(p)
+    return dict(stale)
+
+
 def verify_headers(
-    station_files: Dict[str, List[Path]],
+    station_files: Dict[str, List[str]],
     station_meta: Dict[str, Tuple[float, float, Optional[float]]],
+    write_ok: Optional[Dict[str, bool]] = None,
+    sample_ratio: float = VERIFY_RATIO,
 ) -> None:
-    """Cross-check first SAC header per station and print mismatches."""
+    """
+    Cross-check first SAC header per station and print mismatches.
+    Stations whose write failed (see `update_sac_headers`) are reported
+    without reading; of the others only `sample_ratio` are read back.
+    """
     mismatches: List[Tuple[str, str]] = []
-    for sta, files in tqdm(station_files.items(), desc="Verifying headers", unit="station"):
-        meta = station_meta.get(sta)
-        if meta is None:
+    to_check: List[str] = []
+    for sta in station_files:
+        if sta not in station_meta:
             mismatches.append((sta, "missing_in_table"))
-            continue
-        lat_ref, lon_ref, elev_ref = meta
-        try:
-            sac = SACTrace.read(str(files[0]))
-            issues = []
-            if sac.stla is None or abs(sac.stla - lat_ref) > 1e-4:
-                issues.append(f"lat {sac.stla} ≠ {lat_ref}")
-            if sac.stlo is None or abs(sac.stlo - lon_ref) > 1e-4:
-                issues.append(f"lon {sac.stlo} ≠ {lon_ref}")
-            if (ELEV_COL is not None and elev_ref is not None
-                    and (sac.stel is None or abs(sac.stel - elev_ref) > 0.1)):
-                issues.append(f"elev {sac.stel} ≠ {elev_ref}")
-            if issues:
-                mismatches.append((sta, "; ".join(issues)))
-        except Exception as exc:           # noqa: BLE001
-            mismatches.append((sta, f"read_error: {exc}"))
+        elif write_ok is not None and not write_ok.get(sta, False):
+            mismatches.append((sta, "write_failed"))
+        else:
+            to_check.append(sta)
+
+    if sample_ratio < 1.0 and to_check:
+        n_all = len(to_check)
+        to_check = random.sample(to_check, k=max(1, int(n_all * sample_ratio)))
+        logging.info("Verifying %d of %d stations", len(to_check), n_all)
+
+    with ThreadPoolExecutor(max_workers=IO_THREADS) as ex:
+        results = ex.map(lambda sta: _check_header(station_files[sta][0], station_meta[sta]),
+                         to_check)
+        # 进度条放在 zip 的第一位：它耗尽时 tqdm 才会收尾关闭
+        for issue, sta in zip(_progress(len(to_check), "Verifying headers",
+                                        "station", results), to_check):
+            if issue:
+                mismatches.append((sta, issue))
 
     if mismatches:
         logging.warning("Found %d mismatching stations:\n%s",
@@ -203,6 +448,8 @@ def main() -> None:
         format="%(asctime)s %(levelname)s %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S",
     )
+    # ObsPy 的 INFO 信息对批量改头没有用处
+    logging.getLogger("obspy").setLevel(logging.WARNING)
 
     logging.info("Scanning files with SeisArray…")
     seis = SeisArray(array_dir=str(ARRAY_DIR), pattern=PATTERN)
@@ -213,24 +460,41 @@ def main() -> None:
         sys.exit(1)
     logging.info("Matched %d files", len(all_files))
 
-    # Build {station: [Path,…]}
-    station_files: Dict[str, List[Path]] = {}
-    for f in all_files:
-        station_files.setdefault(f["station"], []).append(Path(f["path"]))
-
     station_meta = read_station_table()
     logging.info("Loaded metadata for %d stations", len(station_meta))
 
-    update_sac_headers(station_files, station_meta)
+    # Build {station: [path,…]}，只保留台站表里有的台站；路径保持 str
+    station_files: Dict[str, List[str]] = defaultdict(list)
+    missing = set()
+    for f in all_files:
+        sta = f["station"]
+        if sta in station_meta:
+            station_files[sta].append(f["path"])
+        else:
+            missing.add(sta)
+    if missing:
+        logging.warning("%d station(s) not in list; skip: %s",
+                        len(missing), ", ".join(sorted(missing)))
+
+    if SKIP_TAGGED:
+        todo = find_stale_files(station_files, station_meta)
+        n_todo = sum(len(files) for files in todo.values())
+        logging.info("%d of %d files need updating; skip the rest",
+                     n_todo, sum(len(files) for files in station_files.values()))
+    else:
+        todo = station_files
+    write_ok = update_sac_headers(todo, station_meta)
+    # 跳过的文件都已核对过头段
+    write_ok.update((sta, True) for sta in station_files if sta not in todo)
     make_station_map(station_meta)
-    verify_headers(station_files, station_meta)
+    verify_headers(station_files, station_meta, write_ok)
 
     # Optional: daily counts sample
-    dates = [Path(f["path"]).stem.split(".")[-2]
-             for f in all_files if "JJJ" not in PATTERN]
+    # 用 SeisArray 已解析出的 time 统计；日期字段解析失败的文件 time 为 None，跳过
+    dates = Counter(f["time"].date() for f in all_files if f.get("time") is not None)
     if dates:
         logging.debug("Sample daily counts: %s",
-                      dict(Counter(dates).most_common(5)))
+                      {day.isoformat(): n for day, n in dates.most_common(5)})
 
     logging.info("Done.")
 
@@ -2,23 +2,28 @@
 """Profile & helper utilities for RESP file support."""
 from __future__ import annotations
 
+from functools import lru_cache
 from typing import Set
 
-from SeisHandler.pattern_utils import FieldRegistry
+from SeisHandler.pattern_utils import FIELD_RE, FieldRegistry
 
 # ── 响应文件必须包含的字段 ───────────────────────────────────────────────────
 REQUIRED_RESPONSE_FIELDS: Set[str] = {"station", "component", "resp_type"}
 
 
-def register_resp_fields() -> None:
-    """冗余注册函数（重复 import 也安全）"""
-    FieldRegistry.register("resp_type", r"(RESP|StationXML|PAZ|FAP)")
-    FieldRegistry.register("version", r"v\d{2}")
+def register_resp_fields(registry: FieldRegistry) -> None:
+    """冗余注册函数（已注册的字段直接跳过，重复调用也安全）"""
+    fields = registry.get_fields()
+    for name, regex_str in (("resp_type", r"(RESP|StationXML|PAZ|FAP)"),
+                            ("version", r"v\d{2}")):
+        if name not in fields:
+            registry.add_field(name, regex_str)
 
 
+@lru_cache(maxsize=32)
 def check_resp_pattern(pattern: str) -> None:
-    """验证 pattern 是否含必需占位符；缺失则抛 ValueError"""
-    fields = set(FieldRegistry.get_fields(pattern))
+    """验证 pattern 是否含必需占位符；缺失则抛 ValueError（结果按 pattern 缓存）"""
+    fields = set(FIELD_RE.findall(pattern))
     missing = REQUIRED_RESPONSE_FIELDS - fields
     if missing:
         raise ValueError(f"RESP pattern 缺少字段: {sorted(missing)} — {pattern}")
@@ -1,7 +1,6 @@
 from __future__ import annotations
 from SeisHandler.seis_array import SeisArray
 from .resp_matcher import RespMatcher
-import SeisHandler.pattern_utils as PU, SeisHandler.seis_array as SA
 
 
 class RespArray(SeisArray):
@@ -18,25 +17,25 @@ class RespArray(SeisArray):
                 "version":  r"v\d{2}"}
         if custom_fields:
             base.update(custom_fields)
-        # ------------------------------------------------------------------ #
-        # 1) 临时关闭日期字段检查
-        def _no_date(_dir, pat, reg):          # noqa: ANN001
-            return reg.build_regex_pattern(pat)
+        super().__init__(resp_dir, pattern, custom_fields=base, **kwargs)
 
-        _orig_pu, _orig_sa = PU.check_pattern, SA.check_pattern
-        PU.check_pattern = SA.check_pattern = _no_date
-        try:
-            super().__init__(resp_dir, pattern, custom_fields=base, **kwargs)
-        finally:
-            PU.check_pattern, SA.check_pattern = _orig_pu, _orig_sa
+    # ---------------------------------------------------------------------- #
+    # 1) 跳过日期字段检查
+    # ---------------------------------------------------------------------- #
+    def _check_pattern(self, pattern: str) -> str:
+        """
+        复写父类方法：RESP 文件名里没有日期字段，只生成正则
+        （不再临时替换模块级 check_pattern，多线程构造也安全）
+        """
+        return self.registry.build_regex_pattern(pattern)
 
     # ---------------------------------------------------------------------- #
-    # 2) 关键：把 match() 换成不用 FileMatcher、而是 RespMatcher
+    # 2) 关键：match() / match_and_filter() 用 RespMatcher、而不是 FileMatcher
     # ---------------------------------------------------------------------- #
-    def match(self, threads: int = 1):
+    def _make_matcher(self) -> RespMatcher:
         """
         复写父类方法：用 RespMatcher（不会派生 time 字段）
+        {home} 在这里是正则而不是目录本身，所以不按目录层级剪枝
         """
-        matcher = RespMatcher(directory=self.array_dir,
-                              regex_pattern=self.pattern)
-        self.files = matcher.match_files(num_threads=threads)
+        return RespMatcher(directory=self.array_dir,
+                           regex_pattern=self.regex)